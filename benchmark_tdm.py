@@ -0,0 +1,351 @@
+"""TDM 儀表板效能基準測試
+
+對每個資料量 N 與每個圖表，在獨立子程序中量測：
+模擬資料建立時間、create_* 建立時間、HTML 輸出時間、峰值 RSS 與輸出 HTML 大小。
+結果存成 JSON，可用 --baseline 與先前的結果比較以找出效能退化。
+每次執行前先檢查匯入模組的時間與記憶體是否在預算內 (--import-only 只做此檢查)，
+以及 compact 儀表板輸出目錄的總大小是否在預算內 (--budget-only 只做這兩項檢查)。
+
+    python benchmark_tdm.py --sizes 1745,100000 --output bench.json
+    python benchmark_tdm.py --baseline bench.json --output bench_new.json
+    python benchmark_tdm.py --import-only
+    python benchmark_tdm.py --budget-only
+"""
+import argparse
+import json
+import os
+import platform
+import py_compile
+import subprocess
+import sys
+import tempfile
+import time
+
+DEFAULT_SIZES = [1745, 100_000, 1_000_000, 10_000_000]
+DEFAULT_CHARTS = ['missing', '3d', 'animation', 'sunburst', 'parallel', 'power']
+REGRESSION_METRICS = ['data_setup_s', 'build_s', 'write_s', 'peak_rss_mb', 'html_bytes']
+# 匯入 interactive_eda_gemini 的預算：時間 (ms) 與 RSS 增加量 (MB)，且不得載入重量級套件
+IMPORT_BUDGET_MS = 150
+IMPORT_BUDGET_MB = 20
+IMPORT_RUNS = 5
+HEAVY_MODULES = ['numpy', 'pandas', 'plotly', 'plotly.graph_objects', 'plotly.express', 'pyarrow']
+# compact 儀表板 (OUTPUT_BUDGET_ROWS 筆模擬資料) 輸出目錄總大小的預算，含共用的 plotly.min.js (約 4.8 MB)；
+# 每個圖表各自內嵌 plotly.js 時約 30 MB
+OUTPUT_BUDGET_MB = 6
+OUTPUT_BUDGET_ROWS = 1745
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 回報，macOS 以 bytes 回報
+    return max_rss / (1024 * 1024) if sys.platform == 'darwin' else max_rss / 1024
+
+
+def _current_rss_mb():
+    """目前 RSS (Linux 讀 /proc/self/statm；其他平台以峰值 RSS 近似)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return _peak_rss_mb()
+
+
+def run_worker(rows, chart_name, out_dir, compact):
+    """子程序：量測單一 (資料量, 圖表)，結果以 JSON 印到 stdout 最後一行"""
+    sys.path.insert(0, SCRIPT_DIR)
+    import contextlib
+    import io
+
+    # numpy / pandas / plotly 在模組中延遲匯入；先行匯入 (並載入 plotly 的圖表樣板)，
+    # 使一次性的匯入成本不計入下列計時區段
+    import numpy  # noqa: F401
+    import pandas  # noqa: F401
+    import plotly.graph_objects as go
+    import plotly.io  # noqa: F401
+    go.Figure(layout=dict(template='plotly_white'))
+
+    # 模組本身的進度訊息不混入 JSON 輸出
+    with contextlib.redirect_stdout(io.StringIO()):
+        import interactive_eda_gemini as eda
+        chart = next(c for c in eda.DASHBOARD_CHARTS if c['name'] == chart_name)
+
+        start = time.perf_counter()
+        eda.set_synthetic_data(rows, seed=42)
+        eda.get_df()
+        data_setup_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        fig = chart['builder'](**chart.get('params', {}))
+        build_s = time.perf_counter() - start
+
+        path = os.path.join(out_dir, chart['filename'])
+        start = time.perf_counter()
+        eda.write_chart_html(fig, path, compact=compact, post_script=chart.get('post_script'))
+        write_s = time.perf_counter() - start
+
+    result = {
+        'rows': rows,
+        'chart': chart_name,
+        'function': chart['builder'].__name__,
+        'status': 'ok',
+        'data_setup_s': round(data_setup_s, 4),
+        'build_s': round(build_s, 4),
+        'write_s': round(write_s, 4),
+        'peak_rss_mb': None if _peak_rss_mb() is None else round(_peak_rss_mb(), 1),
+        'html_bytes': os.path.getsize(path),
+    }
+    print(json.dumps(result))
+
+
+def run_import_worker():
+    """子程序：量測匯入模組的時間與 RSS 增加量，結果以 JSON 印到 stdout"""
+    sys.path.insert(0, SCRIPT_DIR)
+    rss_before = _current_rss_mb()
+    start = time.perf_counter()
+    import interactive_eda_gemini  # noqa: F401
+    import_ms = (time.perf_counter() - start) * 1000
+    rss_after = _current_rss_mb()
+    # 延遲匯入的模組在 sys.modules 中是尚未執行的 _LazyModule
+    loaded = [name for name in HEAVY_MODULES
+              if name in sys.modules and type(sys.modules[name]).__name__ != '_LazyModule']
+    print(json.dumps({
+        'import_ms': round(import_ms, 2),
+        'rss_increase_mb': None if rss_before is None else round(rss_after - rss_before, 2),
+        'heavy_modules_loaded': loaded,
+    }))
+
+
+def run_output_worker(rows, out_dir):
+    """子程序：以 compact 模式建立完整儀表板，輸出目錄總大小以 JSON 印到 stdout 最後一行"""
+    sys.path.insert(0, SCRIPT_DIR)
+    import contextlib
+    import io
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import interactive_eda_gemini as eda
+        eda.set_synthetic_data(rows, seed=42)
+        failures = eda.create_dashboard(compact=True, out_dir=out_dir)
+    print(json.dumps({'output_bytes': eda.output_size(out_dir), 'failures': sorted(failures)}))
+
+
+def check_output_budget(budget_mb=OUTPUT_BUDGET_MB, rows=OUTPUT_BUDGET_ROWS):
+    """在子程序中以 compact 模式建立儀表板，回傳 (結果, 超出預算的項目)"""
+    with tempfile.TemporaryDirectory() as out_dir:
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--output-worker', str(rows), out_dir],
+                              capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {'status': 'error', 'error': proc.stderr.strip()}, ['dashboard build failed']
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result.update(status='ok', rows=rows, budget_mb=budget_mb)
+    violations = []
+    if result['failures']:
+        violations.append(f"建置失敗: {', '.join(result['failures'])}")
+    if result['output_bytes'] > budget_mb * 1e6:
+        violations.append(f"output {result['output_bytes'] / 1e6:.2f}MB > {budget_mb}MB")
+    return result, violations
+
+
+def check_import_budget(budget_ms=IMPORT_BUDGET_MS, budget_mb=IMPORT_BUDGET_MB, runs=IMPORT_RUNS):
+    """在全新子程序中量測匯入成本 runs 次 (取中位數)，回傳 (結果, 超出預算的項目)"""
+    # 先產生 .pyc，量測結果不含一次性的位元組碼編譯 (PYTHONDONTWRITEBYTECODE 時也一樣)
+    py_compile.compile(os.path.join(SCRIPT_DIR, 'interactive_eda_gemini.py'), doraise=True)
+    samples = []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--import-worker'],
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            return {'status': 'error', 'error': proc.stderr.strip()}, ['import failed']
+        samples.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    result = {
+        'status': 'ok',
+        'import_ms': sorted(s['import_ms'] for s in samples)[len(samples) // 2],
+        'rss_increase_mb': None if samples[0]['rss_increase_mb'] is None
+        else sorted(s['rss_increase_mb'] for s in samples)[len(samples) // 2],
+        'heavy_modules_loaded': sorted({name for s in samples for name in s['heavy_modules_loaded']}),
+        'budget_ms': budget_ms,
+        'budget_mb': budget_mb,
+    }
+    violations = []
+    if result['import_ms'] > budget_ms:
+        violations.append(f"import {result['import_ms']:.1f}ms > {budget_ms}ms")
+    if result['rss_increase_mb'] is not None and result['rss_increase_mb'] > budget_mb:
+        violations.append(f"RSS +{result['rss_increase_mb']:.1f}MB > {budget_mb}MB")
+    if result['heavy_modules_loaded']:
+        violations.append(f"匯入時已載入 {', '.join(result['heavy_modules_loaded'])}")
+    return result, violations
+
+
+def run_case(rows, chart_name, compact, timeout):
+    """以獨立子程序執行一個量測，使峰值 RSS 不受其他量測影響"""
+    with tempfile.TemporaryDirectory() as out_dir:
+        cmd = [sys.executable, os.path.abspath(__file__), '--worker', str(rows), chart_name, out_dir]
+        if compact:
+            cmd.append('--compact')
+        start = time.perf_counter()
+        try:
+            proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return {'rows': rows, 'chart': chart_name, 'status': 'timeout', 'wall_s': timeout}
+        wall_s = round(time.perf_counter() - start, 4)
+
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        return {'rows': rows, 'chart': chart_name, 'status': 'error', 'wall_s': wall_s,
+                'error': proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f'exit {proc.returncode}'}
+    result = json.loads(lines[-1])
+    result['wall_s'] = wall_s
+    return result
+
+
+def environment_info():
+    versions = {}
+    for name in ('numpy', 'pandas', 'plotly', 'pyarrow'):
+        try:
+            versions[name] = __import__(name).__version__
+        except ImportError:
+            versions[name] = None
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'git_commit': commit,
+        **versions,
+    }
+
+
+def compare_results(current, baseline, threshold):
+    """與 baseline 比較，回傳超過 threshold 倍的退化項目"""
+    previous = {(r['rows'], r['chart']): r for r in baseline['results'] if r.get('status') == 'ok'}
+    regressions = []
+    for result in current['results']:
+        before = previous.get((result['rows'], result['chart']))
+        if before is None or result.get('status') != 'ok':
+            continue
+        for metric in REGRESSION_METRICS:
+            old, new = before.get(metric), result.get(metric)
+            # 極小的時間差 (<10ms) 多為量測雜訊，不列為退化
+            if not old or new is None or (metric.endswith('_s') and new - old < 0.01):
+                continue
+            if new / old > threshold:
+                regressions.append((result['rows'], result['chart'], metric, old, new))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="TDM 儀表板效能基準測試")
+    parser.add_argument('--sizes', default=','.join(str(n) for n in DEFAULT_SIZES),
+                        help="資料筆數，以逗號分隔 (預設 1745,100000,1000000,10000000)")
+    parser.add_argument('--charts', default=','.join(DEFAULT_CHARTS), help="要量測的圖表，以逗號分隔")
+    parser.add_argument('--output', default='benchmark_results.json', help="結果 JSON 檔 (預設 benchmark_results.json)")
+    parser.add_argument('--baseline', help="先前的結果 JSON，用於比較效能退化")
+    parser.add_argument('--threshold', type=float, default=1.2, help="退化判定倍數 (預設 1.2)")
+    parser.add_argument('--timeout', type=float, default=1800, help="單一量測逾時秒數 (預設 1800)")
+    parser.add_argument('--compact', action='store_true', help="以 compact 模式輸出 HTML")
+    parser.add_argument('--import-budget-ms', type=float, default=IMPORT_BUDGET_MS,
+                        help=f"匯入時間預算 (預設 {IMPORT_BUDGET_MS} ms)")
+    parser.add_argument('--import-budget-mb', type=float, default=IMPORT_BUDGET_MB,
+                        help=f"匯入時 RSS 增加量預算 (預設 {IMPORT_BUDGET_MB} MB)")
+    parser.add_argument('--import-only', action='store_true', help="只檢查匯入時間與記憶體預算")
+    parser.add_argument('--output-budget-mb', type=float, default=OUTPUT_BUDGET_MB,
+                        help=f"compact 儀表板輸出目錄總大小預算 (預設 {OUTPUT_BUDGET_MB} MB，"
+                             f"{OUTPUT_BUDGET_ROWS} 筆模擬資料)")
+    parser.add_argument('--budget-only', action='store_true', help="只檢查匯入成本與輸出大小預算")
+    parser.add_argument('--worker', nargs=3, metavar=('ROWS', 'CHART', 'OUT_DIR'), help=argparse.SUPPRESS)
+    parser.add_argument('--import-worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--output-worker', nargs=2, metavar=('ROWS', 'OUT_DIR'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        rows, chart_name, out_dir = args.worker
+        run_worker(int(rows), chart_name, out_dir, args.compact)
+        return 0
+    if args.import_worker:
+        run_import_worker()
+        return 0
+    if args.output_worker:
+        rows, out_dir = args.output_worker
+        run_output_worker(int(rows), out_dir)
+        return 0
+
+    sizes = [int(n) for n in args.sizes.split(',') if n.strip()]
+    charts = [c.strip() for c in args.charts.split(',') if c.strip()]
+    unknown = sorted(set(charts) - set(DEFAULT_CHARTS))
+    if unknown:
+        parser.error(f"未知的圖表名稱: {', '.join(unknown)} (可用: {', '.join(DEFAULT_CHARTS)})")
+
+    print("=" * 60)
+    print("TDM 儀表板效能基準測試")
+    print("=" * 60)
+    import_result, import_violations = check_import_budget(args.import_budget_ms, args.import_budget_mb)
+    if import_result['status'] == 'ok':
+        rss = import_result['rss_increase_mb']
+        print(f"    匯入 interactive_eda_gemini: {import_result['import_ms']:.1f}ms"
+              + ('' if rss is None else f", RSS +{rss:.1f}MB"))
+    if import_violations:
+        print(f"[OVER BUDGET] {'; '.join(import_violations)}")
+    else:
+        print(f"[OK] 匯入成本在預算內 ({args.import_budget_ms:g}ms / {args.import_budget_mb:g}MB)")
+    if args.import_only:
+        return 1 if import_violations else 0
+
+    output_result, output_violations = check_output_budget(args.output_budget_mb)
+    if output_result['status'] == 'ok':
+        print(f"    compact 儀表板輸出 (N={OUTPUT_BUDGET_ROWS:,}): {output_result['output_bytes'] / 1e6:.2f}MB")
+    if output_violations:
+        print(f"[OVER BUDGET] {'; '.join(output_violations)}")
+    else:
+        print(f"[OK] 輸出大小在預算內 ({args.output_budget_mb:g}MB)")
+    budget_violations = import_violations + output_violations
+    if args.budget_only:
+        return 1 if budget_violations else 0
+
+    report = {'environment': environment_info(), 'compact': args.compact, 'import': import_result,
+              'output': output_result, 'results': []}
+    for rows in sizes:
+        for chart_name in charts:
+            result = run_case(rows, chart_name, args.compact, args.timeout)
+            report['results'].append(result)
+            if result['status'] == 'ok':
+                print(f"    N={rows:>10,}  {chart_name:<10} setup {result['data_setup_s']:>8.2f}s  "
+                      f"build {result['build_s']:>8.2f}s  write {result['write_s']:>7.2f}s  "
+                      f"RSS {result['peak_rss_mb'] or 0:>8.1f}MB  HTML {result['html_bytes'] / 1e6:>8.2f}MB")
+            else:
+                print(f"    N={rows:>10,}  {chart_name:<10} [{result['status'].upper()}] {result.get('error', '')}")
+            # 每筆結果即時寫檔，長時間量測中斷時不遺失已完成的部分
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print()
+    print(f"結果已寫入 {args.output}")
+    # 預算檢查與 baseline 比較都要回報，不因其中一項失敗而略過另一項
+    exit_code = 1 if budget_violations else 0
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(report, baseline, args.threshold)
+        if regressions:
+            print(f"[REGRESSION] 與 {args.baseline} 相比超過 {args.threshold}x:")
+            for rows, chart_name, metric, old, new in regressions:
+                print(f"    N={rows:,} {chart_name} {metric}: {old} -> {new} ({new / old:.2f}x)")
+            exit_code = 1
+        else:
+            print(f"[OK] 與 {args.baseline} 相比無效能退化")
+    if budget_violations:
+        print(f"[OVER BUDGET] {'; '.join(budget_violations)}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
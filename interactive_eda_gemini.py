@@ -1,70 +1,792 @@
-import plotly.graph_objects as go
-import plotly.express as px
-import pandas as pd
-import numpy as np
 import sys
 import io
+import os
+import base64
+import contextlib
+import datetime
+import functools
+import importlib.util
+import json
+import math
+import string
+import time
+import tracemalloc
+import traceback
 
-# 設定 UTF-8 輸出
-if sys.platform == 'win32':
-    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
 
-print("=" * 60)
-print("TDM 互動式 EDA 生成程式 - 最終修正版 (V6 圖例 + 分頁修正)")
-print("=" * 60)
-print()
+def _lazy_import(name):
+    """延遲匯入：回傳的模組在第一次存取屬性時才真正載入 (已載入的模組直接回傳)
+
+    匯入本模組時不載入 numpy / pandas；plotly 則在各圖表函數內才匯入。
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+np = _lazy_import('numpy')
+pd = _lazy_import('pandas')
+
+# ============================================
+# 效能分析 (--profile) 與指標輸出 (--metrics)
+# ============================================
+
+# 啟用後為 {(圖表, 階段): [秒數, 峰值位元組, 次數]}；None 表示停用
+_PROFILE = None
+_PROFILE_STACK = []
+_PROFILE_CHART = '-'
+PROFILE_STAGES = ['data load', 'data prep', 'figure build', 'serialize', 'write']
+
+# 啟用後為 {'stages': {(圖表, 階段): [秒數, 次數]}, 'counters': {(圖表, 名稱): 值}}；None 表示停用
+# 只計時不追蹤記憶體，開銷遠低於 --profile
+_METRICS = None
+METRIC_FORMATS = ('jsonl', 'prometheus')
+METRIC_PREFIX = 'tdm_eda'
+METRIC_COUNTERS = {
+    'rows_loaded': '讀入的資料列數',
+    'traces': '圖表的 trace 數',
+    'points': '圖表的資料點數',
+    'bytes_serialized': '序列化後的 JSON 位元組數',
+    'bytes_written': '寫出的檔案位元組數',
+    'cache_hits': '增量建置快取命中次數',
+    'build_failures': '建置失敗次數',
+}
+
+
+def enable_profiling():
+    """開始記錄各階段時間與峰值記憶體 (tracemalloc，numpy/pandas 配置亦會計入)"""
+    global _PROFILE
+    _PROFILE = {}
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def enable_metrics():
+    """開始記錄各圖表的階段時間與計數器 (見 export_metrics)"""
+    global _METRICS
+    _METRICS = {'stages': {}, 'counters': {}}
+
+
+@contextlib.contextmanager
+def profile_stage(stage):
+    """計時區塊；巢狀階段的時間只計入最內層 (例如 figure build 不含其中的 data load)"""
+    if _PROFILE is None and _METRICS is None:
+        yield
+        return
+    tracing = _PROFILE is not None
+    # frame: [子階段累計秒數, 子階段峰值]
+    if tracing:
+        if _PROFILE_STACK:
+            _PROFILE_STACK[-1][1] = max(_PROFILE_STACK[-1][1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+    frame = [0.0, 0]
+    _PROFILE_STACK.append(frame)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _PROFILE_STACK.pop()
+        if tracing:
+            peak = max(frame[1], tracemalloc.get_traced_memory()[1])
+            record = _PROFILE.setdefault((_PROFILE_CHART, stage), [0.0, 0, 0])
+            record[0] += elapsed - frame[0]
+            record[1] = max(record[1], peak)
+            record[2] += 1
+        if _METRICS is not None:
+            record = _METRICS['stages'].setdefault((_PROFILE_CHART, stage), [0.0, 0])
+            record[0] += elapsed - frame[0]
+            record[1] += 1
+        if _PROFILE_STACK:
+            _PROFILE_STACK[-1][0] += elapsed
+            if tracing:
+                _PROFILE_STACK[-1][1] = max(_PROFILE_STACK[-1][1], peak)
+
+
+@contextlib.contextmanager
+def chart_scope(name):
+    """區塊內的階段時間與計數器歸入圖表 name"""
+    global _PROFILE_CHART
+    previous, _PROFILE_CHART = _PROFILE_CHART, name
+    try:
+        yield
+    finally:
+        _PROFILE_CHART = previous
+
+
+def count_metric(name, value=1):
+    """累加目前圖表的計數器 name (未啟用 --metrics 時不做任何事)"""
+    if _METRICS is not None:
+        key = (_PROFILE_CHART, name)
+        _METRICS['counters'][key] = _METRICS['counters'].get(key, 0) + value
+
+
+def figure_size(fig):
+    """回傳 (trace 數, 資料點數)：每個 trace 以最長的資料陣列計點數，heatmap z 以格數、parcoords 以線數計"""
+    points = 0
+    for trace in fig.data:
+        n = 0
+        for key in ('x', 'y', 'z', 'values', 'ids', 'lat', 'r'):
+            if key in trace and trace[key] is not None:
+                n = max(n, np.size(trace[key]))
+        if 'dimensions' in trace and trace['dimensions']:
+            n = max(n, np.size(trace['dimensions'][0]['values']))
+        points += n
+    return len(fig.data), points
+
+
+def record_figure_metrics(fig):
+    """記錄目前圖表的 trace 數與資料點數"""
+    if _METRICS is None:
+        return
+    traces, points = figure_size(fig)
+    count_metric('traces', traces)
+    count_metric('points', points)
+
+
+def merge_metrics(metrics):
+    """併入子程序回傳的 _METRICS"""
+    for key, (seconds, calls) in metrics['stages'].items():
+        record = _METRICS['stages'].setdefault(key, [0.0, 0])
+        record[0] += seconds
+        record[1] += calls
+    for key, value in metrics['counters'].items():
+        _METRICS['counters'][key] = _METRICS['counters'].get(key, 0) + value
+
+
+def _prometheus_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_metrics(fmt='jsonl', timestamp=None):
+    """將 _METRICS 轉為文字：jsonl 每個 (圖表, 階段/計數器) 一行 JSON，prometheus 為 text exposition format"""
+    if fmt not in METRIC_FORMATS:
+        raise ValueError(f"fmt 必須是 {METRIC_FORMATS} 之一，收到 {fmt!r}")
+    metrics = _METRICS or {'stages': {}, 'counters': {}}
+    timestamp = time.time() if timestamp is None else timestamp
+    if fmt == 'jsonl':
+        lines = [json.dumps({'ts': round(timestamp, 3), 'chart': chart, 'stage': stage,
+                             'seconds': round(seconds, 6), 'calls': calls}, ensure_ascii=False)
+                 for (chart, stage), (seconds, calls) in metrics['stages'].items()]
+        lines += [json.dumps({'ts': round(timestamp, 3), 'chart': chart, 'metric': name, 'value': value},
+                             ensure_ascii=False)
+                  for (chart, name), value in metrics['counters'].items()]
+        return ''.join(line + '\n' for line in lines)
+
+    lines = []
+    for suffix, index, help_text in (('stage_seconds_total', 0, '各圖表各階段的累計秒數 (巢狀階段只計入最內層)'),
+                                     ('stage_calls_total', 1, '各圖表各階段的執行次數')):
+        lines += [f'# HELP {METRIC_PREFIX}_{suffix} {help_text}', f'# TYPE {METRIC_PREFIX}_{suffix} counter']
+        lines += [f'{METRIC_PREFIX}_{suffix}{{chart="{_prometheus_label(chart)}",stage="{_prometheus_label(stage)}"}} '
+                  f'{record[index]:.6g}'
+                  for (chart, stage), record in metrics['stages'].items()]
+    names = list(dict.fromkeys(name for _, name in metrics['counters']))
+    for name in names:
+        lines += [f'# HELP {METRIC_PREFIX}_{name} {METRIC_COUNTERS.get(name, name)}',
+                  f'# TYPE {METRIC_PREFIX}_{name} gauge']
+        lines += [f'{METRIC_PREFIX}_{name}{{chart="{_prometheus_label(chart)}"}} {value}'
+                  for (chart, counter), value in metrics['counters'].items() if counter == name]
+    return '\n'.join(lines) + '\n'
+
+
+def export_metrics(path, fmt='jsonl'):
+    """將指標寫入本機檔案 path
+
+    jsonl 以附加方式寫入，每列帶時間戳記，可累積多次執行的紀錄；
+    prometheus 先寫暫存檔再取代 path (供 node_exporter textfile collector 讀取，不會讀到寫一半的檔案)。
+    """
+    text = format_metrics(fmt)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    if fmt == 'jsonl':
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(text)
+        return
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def format_profile():
+    """以表格列出每個圖表各階段的 秒數 / 峰值 MB"""
+    if not _PROFILE:
+        return "(無效能資料)"
+    charts = list(dict.fromkeys(chart for chart, _ in _PROFILE))
+    lines = ['效能分析 (秒 / 峰值記憶體 MB):',
+             f"    {'chart':<36}" + ''.join(f'{stage:>20}' for stage in PROFILE_STAGES)]
+    totals = {stage: [0.0, 0] for stage in PROFILE_STAGES}
+    for chart in charts:
+        cells = []
+        for stage in PROFILE_STAGES:
+            record = _PROFILE.get((chart, stage))
+            if record is None:
+                cells.append(f"{'-':>20}")
+                continue
+            totals[stage][0] += record[0]
+            totals[stage][1] = max(totals[stage][1], record[1])
+            cells.append(f"{record[0]:>10.3f}s /{record[1] / 1e6:>6.1f}MB")
+        lines.append(f'    {chart:<36}' + ''.join(cells))
+    lines.append(f"    {'TOTAL':<36}" + ''.join(f"{t:>10.3f}s /{m / 1e6:>6.1f}MB" for t, m in totals.values()))
+    try:
+        import resource
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        lines.append(f'    process max RSS: {max_rss / 1024:.1f} MB')
+    except ImportError:
+        pass
+    return '\n'.join(lines)
+
 
 # ============================================
 # 模擬 TDM 資料
-# (保持不變)
+# (向量化產生器，可分塊輸出)
 # ============================================
 
-np.random.seed(42)
-n_total = 1745
+DRUGS = ['Vancomycin', 'Digoxin', 'Phenytoin', 'Theophylline',
+         'Gentamicin', 'Lithium', 'Tacrolimus', 'Cyclosporine',
+         'Carbamazepine', 'Valproic Acid']
+GENDERS = ['M', 'F']
+TIMES = ['Peak', 'Trough']
+DEPARTMENTS = ['ICU', 'Internal Medicine', 'Surgery', 'Pediatrics',
+               'Emergency', 'Nephrology']
+ACCEPT_LEVELS = ['Yes', 'No', 'Unknown']
+MEDICINE_LEVELS = ['Adjusted', 'Maintained', 'Changed']
 
-data = {
-    'Patient_ID': range(1, n_total + 1),
-    'Drug': np.random.choice(['Vancomycin', 'Digoxin', 'Phenytoin', 'Theophylline', 
-                              'Gentamicin', 'Lithium', 'Tacrolimus', 'Cyclosporine',
-                              'Carbamazepine', 'Valproic Acid'], n_total),
-    'Age': np.random.normal(60, 15, n_total).clip(18, 95),
-    'Gender': np.random.choice(['M', 'F'], n_total, p=[0.55, 0.45]),
-    'Dose': np.random.uniform(100, 1000, n_total),
-    'Level': np.random.uniform(5, 50, n_total),
-    'Time': np.random.choice(['Peak', 'Trough'], n_total, p=[0.3, 0.7]),
-    'Department': np.random.choice(['ICU', 'Internal Medicine', 'Surgery', 'Pediatrics', 
-                                    'Emergency', 'Nephrology'], n_total, p=[0.3, 0.25, 0.15, 0.1, 0.1, 0.1])
+# 所有資料來源共用同一份類別標籤：類別欄位只存整數 codes，圖表直接以 codes 查表
+CATEGORY_LEVELS = {
+    'Drug': DRUGS,
+    'Department': DEPARTMENTS,
+    'Gender': GENDERS,
+    'Time': TIMES,
+    'Accept': ACCEPT_LEVELS,
+    'Medicine': MEDICINE_LEVELS,
 }
 
-df = pd.DataFrame(data)
 
-df['Accept'] = None
-accept_indices = np.random.choice(n_total, size=int(n_total * 0.812), replace=False)
-accept_values = np.random.choice(['Yes', 'No'], size=len(accept_indices), p=[0.933, 0.067])
-for idx, val in zip(accept_indices, accept_values):
-    df.loc[idx, 'Accept'] = val
+@functools.lru_cache(maxsize=None)
+def category_dtype(col):
+    """col 欄位共用的 CategoricalDtype"""
+    return pd.CategoricalDtype(CATEGORY_LEVELS[col])
+
+DEFAULT_CHUNK_SIZE = 1_000_000
+# 模擬資料以固定大小的區塊產生 (每塊獨立亂數狀態)，再切成輸出分塊，結果與 chunk_size 無關
+GENERATOR_BLOCK_SIZE = 1_000_000
+
+# 模擬資料的收集時間：自 COLLECTION_START 起每 2 小時一筆；
+# 筆數多到超過 COLLECTION_MAX_SPAN 時縮短間隔，使所有時間落在此範圍內
+COLLECTION_START = datetime.datetime(2024, 1, 1)
+COLLECTION_INTERVAL = datetime.timedelta(hours=2)
+COLLECTION_MAX_SPAN = datetime.timedelta(days=5 * 365)
+
+
+def _chunk_random_state(seed, chunk_index):
+    """每個分塊使用獨立且可重現的亂數狀態 (第 0 塊與舊版 np.random.seed(seed) 相同)"""
+    if chunk_index == 0:
+        return np.random.RandomState(seed)
+    return np.random.RandomState([seed, chunk_index])
+
+
+def _collection_interval(n):
+    interval = np.timedelta64(COLLECTION_INTERVAL).astype('m8[ns]')
+    return min(interval, np.timedelta64(COLLECTION_MAX_SPAN).astype('m8[ns]') // max(n, 1))
+
+
+def _generate_chunk(m, start, rs, accept_carry, interval=None):
+    """產生 m 筆模擬資料 (整欄陣列賦值)，回傳 (DataFrame, 最後一筆 Accept 代碼)"""
+    if interval is None:
+        interval = _collection_interval(m)
+    drug = rs.choice(len(DRUGS), m)
+    age = rs.normal(60, 15, m).clip(18, 95)
+    gender = rs.choice(len(GENDERS), m, p=[0.55, 0.45])
+    dose = rs.uniform(100, 1000, m)
+    level = rs.uniform(5, 50, m)
+    time = rs.choice(len(TIMES), m, p=[0.3, 0.7])
+    department = rs.choice(len(DEPARTMENTS), m, p=[0.3, 0.25, 0.15, 0.1, 0.1, 0.1])
+
+    # Accept: 81.2% 有紀錄，其餘以前一筆補值 (ffill)，開頭無前值者為 Unknown
+    accept = np.full(m, -1, dtype=np.int8)
+    accept_indices = rs.choice(m, size=int(m * 0.812), replace=False)
+    accept[accept_indices] = rs.choice(2, size=len(accept_indices), p=[0.933, 0.067])
+    last_pos = np.where(accept >= 0, np.arange(m), -1)
+    np.maximum.accumulate(last_pos, out=last_pos)
+    accept = np.where(last_pos >= 0, accept[last_pos], accept_carry).astype(np.int8)
+
+    # Medicine: 僅 38.7% 有紀錄，其餘保持缺失 (代碼 -1)
+    medicine = np.full(m, -1, dtype=np.int8)
+    medicine_indices = rs.choice(m, size=int(m * 0.387), replace=False)
+    medicine[medicine_indices] = rs.choice(len(MEDICINE_LEVELS), size=len(medicine_indices))
+
+    chunk = pd.DataFrame({
+        'Patient_ID': np.arange(start + 1, start + m + 1),
+        'Drug': pd.Categorical.from_codes(drug, dtype=category_dtype('Drug')),
+        'Age': age.astype(np.float32),
+        'Gender': pd.Categorical.from_codes(gender, dtype=category_dtype('Gender')),
+        'Dose': dose.astype(np.float32),
+        'Level': level.astype(np.float32),
+        'Time': pd.Categorical.from_codes(time, dtype=category_dtype('Time')),
+        'Department': pd.Categorical.from_codes(department, dtype=category_dtype('Department')),
+        'Accept': pd.Categorical.from_codes(accept, dtype=category_dtype('Accept')),
+        'Medicine': pd.Categorical.from_codes(medicine, dtype=category_dtype('Medicine')),
+        'Collection_Time': np.datetime64(COLLECTION_START, 'ns') + np.arange(start, start + m) * interval,
+    }, index=pd.RangeIndex(start, start + m))
+    return chunk, int(accept[-1]) if m else accept_carry
+
+
+def _iter_tdm_blocks(n, seed):
+    accept_carry = ACCEPT_LEVELS.index('Unknown')
+    interval = _collection_interval(n)
+    for block_index, start in enumerate(range(0, n, GENERATOR_BLOCK_SIZE)):
+        m = min(GENERATOR_BLOCK_SIZE, n - start)
+        rs = _chunk_random_state(seed, block_index)
+        block, accept_carry = _generate_chunk(m, start, rs, accept_carry, interval)
+        yield block
+
+
+def _iter_tdm_chunks(n, seed, chunk_size):
+    """將固定大小的產生區塊重新切成至多 chunk_size 筆的分塊"""
+    pending = None
+    for block in _iter_tdm_blocks(n, seed):
+        pending = block if pending is None else pd.concat([pending, block])
+        while len(pending) >= chunk_size:
+            yield pending.iloc[:chunk_size]
+            pending = pending.iloc[chunk_size:]
+    if pending is not None and len(pending):
+        yield pending
+
+
+def generate_tdm_data(n, seed=42, chunk_size=None):
+    """產生 n 筆模擬 TDM 資料
+
+    chunk_size 為 None 時回傳單一 DataFrame；否則回傳產生器，
+    每次輸出至多 chunk_size 筆，記憶體用量與 n 無關 (至多約 GENERATOR_BLOCK_SIZE + chunk_size 筆)。
+    相同 (n, seed) 每次執行結果完全相同，且與 chunk_size 無關。
+    """
+    if n < 0:
+        raise ValueError(f"n 必須 >= 0，收到 {n}")
+    if chunk_size is not None:
+        if chunk_size <= 0:
+            raise ValueError(f"chunk_size 必須 > 0，收到 {chunk_size}")
+        return _iter_tdm_chunks(n, seed, chunk_size)
+    if n <= GENERATOR_BLOCK_SIZE:
+        chunk, _ = _generate_chunk(n, 0, _chunk_random_state(seed, 0), ACCEPT_LEVELS.index('Unknown'),
+                                   _collection_interval(n))
+        return chunk
+    return pd.concat(list(_iter_tdm_blocks(n, seed)))
 
-df['Accept'] = df['Accept'].fillna(method='ffill') 
-df['Accept'] = df['Accept'].fillna('Unknown') 
 
-df['Medicine'] = None
-medicine_indices = np.random.choice(n_total, size=int(n_total * 0.387), replace=False)
-medicine_values = np.random.choice(['Adjusted', 'Maintained', 'Changed'], size=len(medicine_indices))
-for idx, val in zip(medicine_indices, medicine_values):
-    df.loc[idx, 'Medicine'] = val
+n_total = 1745
+
+# 模擬資料在第一次需要時才產生 (見 get_df)
+df = None
+_SYNTHETIC = (n_total, 42)
+
+
+def set_synthetic_data(rows=n_total, seed=42):
+    """改用 rows 筆、種子 seed 的模擬資料 (延遲產生，並取消已設定的 DATA_STORE)"""
+    global df, _SYNTHETIC, DATA_STORE
+    df, _SYNTHETIC, DATA_STORE = None, (rows, seed), None
+
+
+def get_df():
+    """記憶體中的模擬資料，第一次呼叫時產生"""
+    global df
+    if df is None:
+        with profile_stage('data load'):
+            rows, seed = _SYNTHETIC
+            df = generate_tdm_data(rows, seed=seed)
+        print(f"資料集大小: {len(df)} 筆")
+        print()
+    return df
+
+
+# ============================================
+# 資料載入 (CSV 分塊串流 → Parquet 欄位式儲存)
+# ============================================
+
+# 固定欄位型態：類別欄位使用 category (CATEGORY_LEVELS)，數值欄位使用 float32
+FLOAT_COLUMNS = ['Age', 'Dose', 'Level']
+TIME_COLUMN = 'Collection_Time'
+TDM_COLUMNS = ['Patient_ID', 'Drug', 'Age', 'Gender', 'Dose', 'Level',
+               'Time', 'Department', 'Accept', 'Medicine', TIME_COLUMN]
+
+# 設定後，所有圖表改由此 Parquet 檔讀取所需欄位 (None 表示使用記憶體中的 df)
+DATA_STORE = None
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Parquet 儲存需要 pyarrow，請執行: pip install pyarrow") from e
+    return pyarrow
+
+
+def _arrow_schema(pa):
+    fields = []
+    for col in TDM_COLUMNS:
+        if col in CATEGORY_LEVELS:
+            fields.append(pa.field(col, pa.dictionary(pa.int32(), pa.string())))
+        elif col in FLOAT_COLUMNS:
+            fields.append(pa.field(col, pa.float32()))
+        elif col == TIME_COLUMN:
+            fields.append(pa.field(col, pa.timestamp('ns')))
+        else:
+            fields.append(pa.field(col, pa.int64()))
+    return pa.schema(fields)
+
+
+def _as_category(values, levels):
+    """轉為 category，保留已知類別順序，資料中新出現的值附加在後"""
+    values = values.astype('category')
+    extra = sorted(set(values.cat.categories) - set(levels))
+    return values.cat.set_categories(list(levels) + extra)
+
+
+def coerce_tdm_schema(chunk):
+    """將一個分塊轉為固定欄位型態 (缺少的欄位補為全缺失)"""
+    out = {}
+    for col in TDM_COLUMNS:
+        if col not in chunk:
+            values = pd.Series(np.nan, index=chunk.index)
+        else:
+            values = chunk[col]
+        if col in CATEGORY_LEVELS:
+            out[col] = _as_category(values, CATEGORY_LEVELS[col])
+        elif col in FLOAT_COLUMNS:
+            out[col] = pd.to_numeric(values, errors='coerce').astype(np.float32)
+        elif col == TIME_COLUMN:
+            out[col] = pd.to_datetime(values, errors='coerce').astype('datetime64[ns]')
+        else:
+            out[col] = pd.to_numeric(values, errors='coerce').astype('Int64')
+    return pd.DataFrame(out, index=chunk.index)
+
+
+def category_codes(values, labels):
+    """類別欄位對應到 labels 的位置 (缺失或不在 labels 中為 -1)
+
+    只對類別表 (categories) 查表再以 codes 索引，不產生逐列字串。
+    """
+    values = values.astype('category')
+    position = {label: i for i, label in enumerate(labels)}
+    lookup = np.array([position.get(c, -1) for c in values.cat.categories] + [-1], dtype=np.int64)
+    return lookup[values.cat.codes.to_numpy()]
+
+
+def complete_rows(data, columns):
+    """去除 columns 有缺失的列；沒有缺失時直接回傳原資料 (不複製)"""
+    valid = data[list(columns)].notna().all(axis=1).to_numpy()
+    return data if valid.all() else data[valid]
+
+
+def write_parquet_store(chunks, store_path):
+    """將分塊逐一寫入 Parquet (每塊一個 row group)，回傳總筆數"""
+    pa = _require_pyarrow()
+    schema = _arrow_schema(pa)
+    tmp_path = store_path + '.tmp'
+    n_rows = 0
+    try:
+        with pa.parquet.ParquetWriter(tmp_path, schema, compression='snappy') as writer:
+            for chunk in chunks:
+                chunk = coerce_tdm_schema(chunk)
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+                n_rows += len(chunk)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, store_path)
+    return n_rows
+
+
+def ingest_csv(csv_path, store_path=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """以分塊串流方式讀取 CSV 並轉存為 Parquet，記憶體用量只與 chunk_size 有關
+
+    數值欄位先以字串讀入，再由 coerce_tdm_schema 轉換；無法解析的值 (如低於偵測極限的 '<0.5') 視為缺失。
+    """
+    if store_path is None:
+        store_path = os.path.splitext(csv_path)[0] + '.parquet'
+    dtypes = {col: 'category' for col in CATEGORY_LEVELS}
+    dtypes.update({col: str for col in FLOAT_COLUMNS})
+    reader = pd.read_csv(csv_path, usecols=lambda c: c in TDM_COLUMNS,
+                         dtype=dtypes, chunksize=chunk_size)
+    with reader:
+        n_rows = write_parquet_store(reader, store_path)
+    return store_path, n_rows
+
+
+def write_arrow_store(frame, store_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """將 DataFrame 寫成未壓縮的 Arrow IPC 檔，讀取時可直接 memory-map
+
+    每 chunk_size 列一個 record batch，使 iter_data_chunks 的串流掃描維持有界記憶體。
+    """
+    pa = _require_pyarrow()
+    schema = _arrow_schema(pa)
+    table = pa.Table.from_pandas(coerce_tdm_schema(frame), schema=schema, preserve_index=False)
+    with pa.OSFile(store_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, schema) as writer:
+            writer.write_table(table, max_chunksize=chunk_size)
+    return store_path
+
+
+def _read_arrow_store(path, columns=None):
+    pa = _require_pyarrow()
+    with pa.memory_map(path) as source:
+        table = pa.ipc.open_file(source).read_all()
+        if columns is not None:
+            table = table.select(columns)
+        return table.to_pandas()
+
+
+def use_data_source(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """指定圖表資料來源：.parquet / .arrow 直接使用；.csv 先轉存 (若已有較新的 .parquet 則沿用)"""
+    global DATA_STORE
+    if path.lower().endswith('.csv'):
+        store_path = os.path.splitext(path)[0] + '.parquet'
+        if not (os.path.exists(store_path)
+                and os.path.getmtime(store_path) >= os.path.getmtime(path)):
+            ingest_csv(path, store_path, chunk_size=chunk_size)
+        path = store_path
+    elif not os.path.exists(path):
+        raise FileNotFoundError(path)
+    DATA_STORE = path
+    return path
+
+
+def load_columns(columns=None):
+    """只讀取圖表需要的欄位 (columns 為 None 表示全部欄位)"""
+    if DATA_STORE is None:
+        data = get_df()
+        data = data if columns is None else data[columns]
+    else:
+        with profile_stage('data load'):
+            if DATA_STORE.endswith('.arrow'):
+                data = _read_arrow_store(DATA_STORE, columns)
+            else:
+                data = pd.read_parquet(DATA_STORE, columns=columns)
+    count_metric('rows_loaded', len(data))
+    return data
+
+
+def iter_data_chunks(columns=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """依序產出資料分塊 (Parquet 以 row group、Arrow 以 record batch 為單位)，記憶體用量與總筆數無關"""
+    if DATA_STORE is None:
+        data = load_columns(columns)
+        for start in range(0, len(data), chunk_size):
+            yield data.iloc[start:start + chunk_size]
+        return
+    pa = _require_pyarrow()
+    if DATA_STORE.endswith('.arrow'):
+        with pa.memory_map(DATA_STORE) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                if columns is not None:
+                    batch = batch.select(columns)
+                with profile_stage('data load'):
+                    chunk = batch.to_pandas()
+                count_metric('rows_loaded', len(chunk))
+                yield chunk
+        return
+    parquet_file = pa.parquet.ParquetFile(DATA_STORE)
+    for i in range(parquet_file.num_row_groups):
+        with profile_stage('data load'):
+            chunk = parquet_file.read_row_group(i, columns=columns).to_pandas()
+        count_metric('rows_loaded', len(chunk))
+        yield chunk
 
-print(f"資料集大小: {len(df)} 筆")
-print()
+
+def data_row_count():
+    """資料筆數 (Parquet 來源直接讀取 metadata，不載入資料)"""
+    if DATA_STORE is None:
+        return _SYNTHETIC[0] if df is None else len(df)
+    pa = _require_pyarrow()
+    if DATA_STORE.endswith('.arrow'):
+        with pa.memory_map(DATA_STORE) as source:
+            reader = pa.ipc.open_file(source)
+            return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+    return pa.parquet.ParquetFile(DATA_STORE).metadata.num_rows
 
 # ============================================
-# 函數 1: 缺失值分析 (保持不變)
+# 大量資料縮減 (分層抽樣 / 3D 體素分箱)
 # ============================================
 
+# 散點圖與平行座標圖在抽樣模式下最多輸出的資料點數
+DEFAULT_POINT_BUDGET = 50_000
+REDUCE_MODES = (None, 'sample', 'voxel')
+
+
+def _strata_key(data, strata):
+    """將多個類別欄位組合為單一整數分層代碼 (缺失值自成一層)"""
+    key = np.zeros(len(data), dtype=np.int64)
+    n_keys = 1
+    for col in strata:
+        codes = pd.Categorical(data[col]).codes.astype(np.int64) + 1
+        n_levels = int(codes.max()) + 1 if len(codes) else 1
+        key = key * n_levels + codes
+        n_keys *= n_levels
+    return key, n_keys
+
+
+def _robust_outlier_score(data, columns):
+    """各數值欄位的 robust z-score (median / MAD) 取最大值"""
+    values = data[list(columns)].to_numpy(dtype=np.float64)
+    median = np.nanmedian(values, axis=0)
+    mad = np.nanmedian(np.abs(values - median), axis=0) * 1.4826
+    z = np.abs(values - median) / np.where(mad > 0, mad, np.inf)
+    return np.nan_to_num(z, nan=0.0).max(axis=1)
+
+
+def stratified_sample(data, point_budget=DEFAULT_POINT_BUDGET, strata=('Drug', 'Accept'),
+                      outlier_columns=('Age', 'Dose', 'Level'), outlier_z=3.5, seed=0):
+    """依 strata 分層等比例抽樣，離群值 (robust z > outlier_z) 優先保留
+
+    輸出筆數至多 point_budget；離群值最多佔一半預算，超過時保留最極端者。
+    資料筆數未超過預算時原樣回傳。
+    """
+    n = len(data)
+    if n <= point_budget:
+        return data
+
+    keep = np.zeros(n, dtype=bool)
+    score = _robust_outlier_score(data, outlier_columns)
+    outlier_idx = np.flatnonzero(score > outlier_z)
+    max_outliers = point_budget // 2
+    if len(outlier_idx) > max_outliers:
+        outlier_idx = outlier_idx[np.argsort(-score[outlier_idx], kind='stable')[:max_outliers]]
+    keep[outlier_idx] = True
+
+    # 剩餘預算以最大餘數法分配到各層，總數恰為 remaining
+    remaining = point_budget - len(outlier_idx)
+    key, n_keys = _strata_key(data, strata)
+    pool_idx = np.flatnonzero(~keep)
+    counts = np.bincount(key[pool_idx], minlength=n_keys)
+    exact = counts * (remaining / counts.sum())
+    quota = np.floor(exact).astype(np.int64)
+    leftover = remaining - int(quota.sum())
+    if leftover > 0:
+        quota[np.argsort(-(exact - quota), kind='stable')[:leftover]] += 1
+    quota = np.minimum(quota, counts)
+
+    # 每層內以隨機優先序取前 quota 筆 (一次 lexsort，不逐層過濾)
+    priority = np.random.default_rng(seed).random(len(pool_idx))
+    order = pool_idx[np.lexsort((priority, key[pool_idx]))]
+    sorted_key = key[order]
+    rank = np.arange(len(order)) - np.searchsorted(sorted_key, sorted_key, side='left')
+    keep[order[rank < quota[sorted_key]]] = True
+    return data[keep]
+
+
+def voxel_bin(data, columns=('Age', 'Dose', 'Level'), bins=24):
+    """將資料點分入 bins^3 個等寬體素，回傳非空體素的中心座標與筆數"""
+    values = data[list(columns)].to_numpy(dtype=np.float64)
+    values = values[~np.isnan(values).any(axis=1)]
+    if len(values) == 0:
+        return pd.DataFrame({**{col: [] for col in columns}, 'Count': []})
+    lo = values.min(axis=0)
+    width = (values.max(axis=0) - lo) / bins
+    width[width == 0] = 1.0
+    idx = np.clip(((values - lo) / width).astype(np.int64), 0, bins - 1)
+    key = (idx[:, 0] * bins + idx[:, 1]) * bins + idx[:, 2]
+    counts = np.bincount(key, minlength=bins ** 3)
+    occupied = np.flatnonzero(counts)
+    centers = lo + (np.stack(np.unravel_index(occupied, (bins,) * 3), axis=1) + 0.5) * width
+    binned = pd.DataFrame(centers, columns=list(columns))
+    binned['Count'] = counts[occupied]
+    return binned
+
+
+def _sampling_note(n_shown, n_total):
+    fraction = n_shown / n_total if n_total else 1.0
+    return f'Showing {n_shown:,} of {n_total:,} records ({fraction:.1%})'
+
+
+# ============================================
+# 函數 1: 缺失值分析 (分塊單次掃描)
+# ============================================
+
+MISSING_GROUP_COLUMNS = ('Department', 'Drug')
+
+
+def update_missing_profile(state, batch, group_columns=MISSING_GROUP_COLUMNS):
+    """累加一批資料的缺失計數，回傳更新後的 state (第一次呼叫傳入 state=None)
+
+    state 只保存總筆數、各欄位缺失筆數、各欄位對同時缺失的筆數矩陣，
+    以及依 group_columns 分組的筆數與缺失筆數，記憶體用量與資料總筆數無關。
+    """
+    if state is None:
+        state = {'rows': 0, 'fields': list(batch.columns),
+                 'group_columns': [col for col in group_columns if col in batch.columns],
+                 'missing': np.zeros(len(batch.columns), dtype=np.int64),
+                 'co_missing': np.zeros((len(batch.columns),) * 2, dtype=np.int64),
+                 'groups': {}}
+    if len(batch) == 0:
+        return state
+    nullmask = batch[state['fields']].isnull()
+    mask = nullmask.to_numpy(dtype=np.float32)
+    state['rows'] += len(batch)
+    state['missing'] += nullmask.sum().to_numpy(dtype=np.int64)
+    # 以矩陣乘法計算同時缺失筆數；float32 在單一分塊 (< 2^24 筆) 內為精確整數
+    state['co_missing'] += np.rint(mask.T @ mask).astype(np.int64)
+    nullmask.insert(0, 'Rows', True)
+    for col in state['group_columns']:
+        counts = nullmask.groupby(batch[col], observed=True).sum()
+        previous = state['groups'].get(col)
+        if previous is not None:
+            counts = previous.add(counts, fill_value=0).astype(np.int64)
+        state['groups'][col] = counts
+    return state
+
+
+def missing_profile(columns=None, group_columns=MISSING_GROUP_COLUMNS):
+    """以單次分塊掃描計算缺失值概況 (見 update_missing_profile)"""
+    state = None
+    for chunk in iter_data_chunks(columns):
+        state = update_missing_profile(state, chunk, group_columns)
+    if state is None or state['rows'] == 0:
+        raise ValueError("資料為空，無法計算缺失值概況")
+    return state
+
+
+def missing_rates(state, group_column=None):
+    """由缺失計數計算缺失率 (%)：整體回傳各欄位的 Series，指定 group_column 則回傳各組 × 欄位的 DataFrame"""
+    if group_column is None:
+        return pd.Series(state['missing'], index=state['fields']) / state['rows'] * 100
+    counts = state['groups'][group_column]
+    rows = counts['Rows']
+    return counts.drop(columns='Rows').div(rows.where(rows > 0), axis=0) * 100
+
+
+def co_missing_rates(state):
+    """兩兩欄位同時缺失的比例 (%)，對角線即各欄位缺失率"""
+    return pd.DataFrame(state['co_missing'] / state['rows'] * 100,
+                        index=state['fields'], columns=state['fields'])
+
+
 def create_interactive_missing_analysis():
-    """創建互動式缺失值分析"""
-    
-    missing_data = df.isnull().sum() / len(df) * 100
+    """創建互動式缺失值分析
+
+    缺失率由分塊單次掃描累加的計數計算 (見 missing_profile)，不需將資料整個載入記憶體；
+    下拉選單可切換依 Department / Drug 分組的缺失率與欄位間同時缺失的比例。
+    """
+    with profile_stage('data prep'):
+        state = missing_profile()
+    return _missing_figure(state)
+
+
+def _missing_figure(state):
+    """由缺失計數 state 繪製缺失值分析圖"""
+    import plotly.graph_objects as go
+    n_rows = state['rows']
+    missing_data = missing_rates(state)
     missing_data = missing_data[missing_data > 0].sort_values(ascending=False)
+    fields = list(missing_data.index)
     
     colors_list = ['#e74c3c' if x > 50 else '#f39c12' if x > 15 else '#3498db' 
                    for x in missing_data.values]
@@ -91,7 +813,7 @@ def create_interactive_missing_analysis():
     
     fig.update_layout(
         title=dict(
-            text='<b>Missing Data Analysis</b><br>TDM Dataset (N=1,745)',
+            text=f'<b>Missing Data Analysis</b><br>TDM Dataset (N={n_rows:,})',
             x=0.5,
             xanchor='center',
             font=dict(size=20)
@@ -104,72 +826,282 @@ def create_interactive_missing_analysis():
         showlegend=False
     )
     
+    # 分組缺失率與同時缺失比例，以下拉選單切換顯示
+    views = [('By Field', 'Missing Rate (%)', 'Field')]
+    for col in state['group_columns']:
+        rates = missing_rates(state, col)[fields]
+        fig.add_trace(go.Heatmap(
+            z=rates.to_numpy(), x=fields, y=[str(level) for level in rates.index],
+            colorscale='Reds', zmin=0, visible=False, colorbar=dict(title='%'),
+            hovertemplate=f'<b>{col}: %{{y}}</b><br>%{{x}} 缺失率: %{{z:.1f}}%<extra></extra>'
+        ))
+        views.append((f'By {col}', 'Field', col))
+    if fields:
+        co_rates = co_missing_rates(state).loc[fields, fields]
+        fig.add_trace(go.Heatmap(
+            z=co_rates.to_numpy(), x=fields, y=fields,
+            colorscale='Purples', zmin=0, visible=False, colorbar=dict(title='%'),
+            hovertemplate='%{y} & %{x} 同時缺失: %{z:.1f}%<extra></extra>'
+        ))
+        views.append(('Co-missingness', 'Field', 'Field'))
+    if len(views) > 1:
+        shapes, annotations = fig.layout.shapes, fig.layout.annotations
+        buttons = []
+        for i, (label, x_title, y_title) in enumerate(views):
+            visible = [j == i for j in range(len(views))]
+            buttons.append(dict(label=label, method='update', args=[
+                {'visible': visible},
+                {'xaxis.title.text': x_title, 'yaxis.title.text': y_title,
+                 'shapes': shapes if i == 0 else [], 'annotations': annotations if i == 0 else []}
+            ]))
+        fig.update_layout(updatemenus=[dict(buttons=buttons, direction='down', x=0, xanchor='left',
+                                            y=1.15, yanchor='top')])
+    
     return fig
 
 # ============================================
 # 函數 2: 3D 散點圖 (V6 - 2D 假圖例)
 # ============================================
 
-def create_3d_scatter():
-    """創建 3D 互動散點圖 - 使用 2D 假圖例解決文字裁切問題"""
-    
-    df_complete = df.dropna(subset=['Age', 'Dose', 'Level']).copy()
-    
-    drug_short = {
-        'Vancomycin': 'Vanc', 'Digoxin': 'Dig', 'Phenytoin': 'Phen', 'Theophylline': 'Theo', 
-        'Gentamicin': 'Gent', 'Lithium': 'Li', 'Tacrolimus': 'Tacro', 'Cyclosporine': 'Cyclo',
-        'Carbamazepine': 'Carba', 'Valproic Acid': 'VPA'
+# single_trace='auto' 時，資料量達此筆數即改用單一 trace 模式
+SCATTER3D_SINGLE_TRACE_MIN_ROWS = 50_000
+
+# 單一 trace 模式的圖例點擊處理：依 layout.meta.groups 的排序區段重建可見資料點
+SCATTER3D_LEGEND_JS = """
+(function() {
+    var gd = document.getElementById('{plot_id}');
+    var groups = ((gd.layout || {}).meta || {}).groups;
+    if (!groups) { return; }
+    var KEYS = ['x', 'y', 'z', 'text', 'marker.color', 'marker.symbol'];
+    var full = null, hidden = {};
+    function get(trace, key) {
+        return key.split('.').reduce(function(o, k) { return o[k]; }, trace);
     }
-    
-    df_complete.loc[:, 'Drug_Short'] = df_complete['Drug'].map(drug_short)
-    df_complete.loc[:, 'Drug_Full'] = df_complete['Drug']
-    
-    drugs = df_complete['Drug_Short'].unique()
-    colors = px.colors.qualitative.Plotly[:len(drugs)] 
-    color_map = {d: c for d, c in zip(drugs, colors)}
+
+    // 逐點的標籤與符號由分組區段展開，避免在 HTML 中重複數百萬個字串
+    var n = groups.length ? groups[groups.length - 1].stop : 0;
+    var text = new Array(n), symbol = new Array(n);
+    groups.forEach(function(g) {
+        for (var i = g.start; i < g.stop; i++) { text[i] = g.label; symbol[i] = g.symbol; }
+    });
+    Plotly.restyle(gd, {text: [text], 'marker.symbol': [symbol]}, [0]);
+
+    gd.on('plotly_legendclick', function(ev) {
+        if (ev.curveNumber === 0) { return false; }
+        if (!full) {
+            // _fullData 中的 base64 typed array 已解碼，可直接切片
+            var trace = (gd._fullData || gd.data)[0];
+            full = {};
+            KEYS.forEach(function(k) { full[k] = get(trace, k); });
+        }
+        var name = ev.data[ev.curveNumber].legendgroup;
+        hidden[name] = !hidden[name];
+        var update = {};
+        KEYS.forEach(function(k) {
+            var src = full[k], out = [];
+            groups.forEach(function(g) {
+                if (hidden[g.name]) { return; }
+                for (var i = g.start; i < g.stop; i++) { out.push(src[i]); }
+            });
+            update[k] = [out];
+        });
+        Plotly.restyle(gd, update, [0]);
+        Plotly.restyle(gd, {visible: hidden[name] ? 'legendonly' : true}, [ev.curveNumber]);
+        return false;
+    });
+    gd.on('plotly_legenddoubleclick', function() { return false; });
+})();
+"""
+
+
+def _add_scatter3d_single_trace(fig, df_complete, drug_codes, accept_codes, drugs, color_map, symbol_map):
+    """所有資料點放入單一 Scatter3d：以 (藥物, 接受狀態) 排序一次，圖例以排序區段控制顯示
+
+    drug_codes / accept_codes 為各點在 drugs / symbol_map 中的位置 (-1 表示不顯示)。
+    只輸出數值陣列 (座標與藥物代碼)；逐點的標籤與符號記錄在 layout.meta.groups，
+    由 SCATTER3D_LEGEND_JS 在瀏覽器端展開。
+    """
+    import plotly.graph_objects as go
+    accept_levels = list(symbol_map)
+    group_key = drug_codes * len(accept_levels) + accept_codes
+
+    shown = np.flatnonzero((drug_codes >= 0) & (accept_codes >= 0))
+    order = shown[np.argsort(group_key[shown], kind='stable')]
+    counts = np.bincount(group_key[shown], minlength=len(drugs) * len(accept_levels))
+    bounds = np.concatenate([[0], np.cumsum(counts)])
+
+    groups = []
+    for key, count in enumerate(counts):
+        if count == 0:
+            continue
+        drug, accept_status = drugs[key // len(accept_levels)], accept_levels[key % len(accept_levels)]
+        groups.append(dict(name=f'group_{drug}_{accept_status}',
+                           label=f'{drug}, {accept_status}',
+                           symbol=symbol_map[accept_status],
+                           start=int(bounds[key]), stop=int(bounds[key + 1])))
+
+    # 藥物代碼 → 顏色的離散色階
+    colorscale = []
+    for i, drug in enumerate(drugs):
+        colorscale += [[i / len(drugs), color_map[drug]], [(i + 1) / len(drugs), color_map[drug]]]
+
+    fig.add_trace(go.Scatter3d(
+        x=df_complete['Age'].to_numpy()[order],
+        y=df_complete['Dose'].to_numpy()[order],
+        z=df_complete['Level'].to_numpy()[order],
+        mode='markers',
+        showlegend=False,
+        marker=dict(
+            size=5,
+            color=drug_codes[order],
+            colorscale=colorscale,
+            cmin=-0.5,
+            cmax=len(drugs) - 0.5,
+            line=dict(width=0.3, color='white')
+        ),
+        hovertemplate=
+            "<b>%{text}</b><br>" +
+            "Age: %{x} years<br>" +
+            "Dose: %{y} mg<br>" +
+            "Level: %{z} ug/mL<extra></extra>"
+    ))
+    fig.update_layout(meta=dict(groups=groups))
+    return {g['name'] for g in groups}
+
+
+def _create_3d_voxel_figure(binned, n_rows):
+    """體素分箱版 3D 圖：每個非空體素一個點，大小與顏色代表筆數"""
+    import plotly.graph_objects as go
+    fig = go.Figure(go.Scatter3d(
+        x=binned['Age'],
+        y=binned['Dose'],
+        z=binned['Level'],
+        mode='markers',
+        marker=dict(
+            size=3 + 12 * np.sqrt(binned['Count'] / binned['Count'].max()),
+            color=binned['Count'],
+            colorscale='Viridis',
+            showscale=True,
+            colorbar=dict(title='Count'),
+            opacity=0.8
+        ),
+        hovertemplate=
+            "Count: %{marker.color:,}<br>" +
+            "Age: %{x:.0f} years<br>" +
+            "Dose: %{y:.0f} mg<br>" +
+            "Level: %{z:.1f} ug/mL<extra></extra>"
+    ))
+    fig.update_layout(
+        title=dict(text=f'<b>3D Density (Voxel Binning)</b><br>{n_rows:,} records in {len(binned):,} voxels',
+                   x=0.5, xanchor='center'),
+        height=850,
+        width=1400,
+        margin=dict(l=20, t=80, b=20),
+        scene=dict(
+            xaxis_title='Age (years)',
+            yaxis_title='Dose (mg)',
+            zaxis_title='Drug Level (ug/mL)',
+            camera=dict(eye=dict(x=1.3, y=1.3, z=1.1))
+        ),
+        template='plotly_white'
+    )
+    return fig
+
+
+DRUG_SHORT = {
+    'Vancomycin': 'Vanc', 'Digoxin': 'Dig', 'Phenytoin': 'Phen', 'Theophylline': 'Theo',
+    'Gentamicin': 'Gent', 'Lithium': 'Li', 'Tacrolimus': 'Tacro', 'Cyclosporine': 'Cyclo',
+    'Carbamazepine': 'Carba', 'Valproic Acid': 'VPA'
+}
+
+
+def create_3d_scatter(single_trace=False, reduce=None, point_budget=DEFAULT_POINT_BUDGET, voxel_bins=24):
+    """創建 3D 互動散點圖 - 使用 2D 假圖例解決文字裁切問題
+
+    single_trace=True 時所有點合併為單一 WebGL trace，懸停標籤、符號與圖例點擊需搭配 SCATTER3D_LEGEND_JS
+    (儀表板會自動加入；直接 fig.show() / write_html 時請維持預設 False)；
+    'auto' 表示資料量達 SCATTER3D_SINGLE_TRACE_MIN_ROWS 時才啟用。
+    reduce='sample' 以分層抽樣限制在 point_budget 點內；reduce='voxel' 改畫體素筆數。
+    """
+    import plotly.graph_objects as go
+    from plotly.colors import qualitative
+    if reduce not in REDUCE_MODES:
+        raise ValueError(f"reduce 必須是 {REDUCE_MODES} 之一，收到 {reduce!r}")
     
     symbol_map = {'Yes': 'diamond', 'No': 'square', 'Unknown': 'circle'}
+    with profile_stage('data prep'):
+        data = load_columns(['Drug', 'Age', 'Dose', 'Level', 'Accept'])
+        df_complete = complete_rows(data, ['Age', 'Dose', 'Level'])
+        n_complete = len(df_complete)
+        if reduce == 'voxel':
+            binned = voxel_bin(df_complete, bins=voxel_bins)
+        else:
+            if reduce == 'sample':
+                df_complete = stratified_sample(df_complete, point_budget)
+            # 藥物以類別 codes 查 DRUG_SHORT，依資料中首次出現的順序排列 (不建立逐列字串欄位)
+            drug = df_complete['Drug'].astype('category')
+            codes = drug.cat.codes.to_numpy()
+            drug_names = [drug.cat.categories[code] for code in pd.unique(codes[codes >= 0])]
+            drug_codes = category_codes(drug, drug_names)
+            accept_codes = category_codes(df_complete['Accept'], list(symbol_map))
+    if reduce == 'voxel':
+        return _create_3d_voxel_figure(binned, n_complete)
+    
+    drugs = [DRUG_SHORT.get(name, name) for name in drug_names]
+    # 藥物數可能超過色盤長度 (資料中保留未知藥物)，循環使用色盤
+    palette = qualitative.Plotly
+    color_map = {d: palette[i % len(palette)] for i, d in enumerate(drugs)}
     
     fig = go.Figure()
     
-    # 1. 添加所有 3D 數據點，但關閉它們的圖例
-    for drug in drugs:
-        df_drug = df_complete[df_complete['Drug_Short'] == drug]
-        for accept_status, symbol_val in symbol_map.items():
-            df_subset = df_drug[df_drug['Accept'] == accept_status]
+    if single_trace == 'auto':
+        single_trace = len(df_complete) >= SCATTER3D_SINGLE_TRACE_MIN_ROWS
+    
+    legend_groups = None
+    if single_trace:
+        legend_groups = _add_scatter3d_single_trace(fig, df_complete, drug_codes, accept_codes, drugs,
+                                                    color_map, symbol_map)
+    else:
+        age, dose, level = (df_complete[col].to_numpy() for col in ('Age', 'Dose', 'Level'))
+        # 1. 添加所有 3D 數據點，但關閉它們的圖例
+        for drug_index, drug in enumerate(drugs):
+            is_drug = drug_codes == drug_index
+            for accept_index, (accept_status, symbol_val) in enumerate(symbol_map.items()):
+                subset = is_drug & (accept_codes == accept_index)
             
-            fig.add_trace(go.Scatter3d(
-                x=df_subset['Age'],
-                y=df_subset['Dose'],
-                z=df_subset['Level'],
-                mode='markers',
+                fig.add_trace(go.Scatter3d(
+                    x=age[subset],
+                    y=dose[subset],
+                    z=level[subset],
+                    mode='markers',
                 
-                # 核心修正：關閉 3D 圖例
-                showlegend=False, 
+                    # 核心修正：關閉 3D 圖例
+                    showlegend=False, 
                 
-                # 將圖例分組，以便 2D 假圖例可以點擊控制它們
-                legendgroup=f'group_{drug}_{accept_status}',
+                    # 將圖例分組，以便 2D 假圖例可以點擊控制它們
+                    legendgroup=f'group_{drug}_{accept_status}',
                 
-                marker=dict(
-                    size=5,
-                    color=color_map[drug],
-                    symbol=symbol_val,
-                    line=dict(width=0.3, color='white')
-                ),
-                hovertemplate=
-                    f"<b>{drug}</b><br>" +
-                    "Accept: %{customdata[0]}<br>" +
-                    "Age: %{x} years<br>" +
-                    "Dose: %{y} mg<br>" +
-                    "Level: %{z} ug/mL<extra></extra>",
-                customdata=df_subset[['Accept']]
-            ))
+                    marker=dict(
+                        size=5,
+                        color=color_map[drug],
+                        symbol=symbol_val,
+                        line=dict(width=0.3, color='white')
+                    ),
+                    hovertemplate=
+                        f"<b>{drug}</b><br>" +
+                        f"Accept: {accept_status}<br>" +
+                        "Age: %{x} years<br>" +
+                        "Dose: %{y} mg<br>" +
+                        "Level: %{z} ug/mL<extra></extra>"
+                ))
 
     # 2. 添加 2D "假" Trace，僅用於生成圖例
     # 這些是 go.Scatter (2D)，不是 go.Scatter3d
     # 它的渲染器是穩定的，會自動計算文字寬度
     for drug in drugs:
         for accept_status, symbol_val in symbol_map.items():
+            if legend_groups is not None and f'group_{drug}_{accept_status}' not in legend_groups:
+                continue
             fig.add_trace(go.Scatter(
                 x=[None], y=[None], # 沒有實際數據
                 mode='markers',
@@ -228,123 +1160,671 @@ def create_3d_scatter():
         )
     )
     
+    if reduce == 'sample':
+        fig.update_layout(title=dict(text=f'<b>3D Scatter</b><br>{_sampling_note(len(df_complete), n_complete)}',
+                                     x=0.43, xanchor='center'))
+    
     return fig
 
 # ============================================
 # 函數 3-6 (保持不變)
 # ============================================
 
-def create_animated_data_collection():
-    """創建數據收集過程動畫 - 顯示完整率上升曲線"""
-    dates = pd.date_range(start='2024-01-01', periods=len(df), freq='2h')
-    completeness_rates = []
-    for i in range(1, len(df) + 1):
-        base_rate = 60 + (81.2 - 60) * (i / len(df))
-        noise = np.random.normal(0, 1)
-        rate = np.clip(base_rate + noise, 0, 100)
-        completeness_rates.append(rate)
-    df_anim = pd.DataFrame({'Collection_Time': dates, 'Cumulative_Count': range(1, len(df) + 1), 'Completeness_Rate': completeness_rates})
-    df_plot = df_anim.iloc[::10].copy()
-    fig = px.line(df_plot, x='Collection_Time', y='Completeness_Rate', title='<b>Data Collection Animation</b><br>Completeness Rate Over Time',
-        labels={'Collection_Time': 'Collection Time', 'Completeness_Rate': 'Completeness Rate (%)'}, range_y=[0, 100])
-    fig.update_traces(line=dict(color='#3498db', width=3), mode='lines+markers', marker=dict(size=8))
-    fig.add_hline(y=80, line_dash="dash", line_color="green", annotation_text="Target: 80%", annotation_position="right")
-    fig.add_hline(y=81.2, line_dash="dot", line_color="blue", annotation_text="Final: 81.2%", annotation_position="left")
-    fig.update_layout(height=600, template='plotly_white', showlegend=False, hovermode='x unified')
+# 完整率曲線的時間區間候選 (由細到粗)，自動挑選使區間數不超過 max_buckets 者
+COMPLETENESS_BUCKET_FREQS = ['1h', '6h', '1D', '7D', '30D']
+
+
+def _auto_bucket_freq(t_min, t_max, max_buckets=200):
+    span = pd.Timestamp(t_max) - pd.Timestamp(t_min)
+    for freq in COMPLETENESS_BUCKET_FREQS:
+        if span / pd.Timedelta(freq) <= max_buckets:
+            return freq
+    return COMPLETENESS_BUCKET_FREQS[-1]
+
+
+def update_completeness(state, batch, freq='1D', time_column=TIME_COLUMN):
+    """累加一批資料的逐時間區間計數，回傳更新後的 state (第一次呼叫傳入 state=None)
+
+    state 只保存每個區間的筆數與各欄位非缺失筆數，新資料追加時只需處理新批次，
+    不必重新掃描已處理的資料；累積完整率由 completeness_curve 依區間累加計算。
+    """
+    if state is None:
+        state = {'freq': freq, 'time_column': time_column, 'counts': None,
+                 'fields': [col for col in batch.columns if col != time_column]}
+    times = batch[state['time_column']]
+    valid = times.notna().to_numpy()
+    if not valid.any():
+        return state
+    present = batch.loc[valid, state['fields']].notna()
+    present.insert(0, 'Rows', True)
+    counts = present.groupby(times[valid].dt.floor(state['freq']).to_numpy()).sum()
+    if state['counts'] is not None:
+        counts = state['counts'].add(counts, fill_value=0).astype(np.int64)
+    state['counts'] = counts
+    return state
+
+
+def completeness_curve(state):
+    """由區間計數計算累積完整率 (%)：整體 (所有欄位的非缺失格數比例) 及各欄位"""
+    counts = state['counts'].sort_index()
+    cumulative = counts.cumsum()
+    rows = cumulative.pop('Rows')
+    curve = cumulative.div(rows, axis=0) * 100
+    curve.insert(0, 'Overall', cumulative.sum(axis=1) / (rows * len(state['fields'])) * 100)
+    curve.insert(0, 'Cumulative_Count', rows)
+    curve.index.name = state['time_column']
+    return curve
+
+
+def create_animated_data_collection(freq=None, target=80.0):
+    """創建數據收集過程動畫 - 依收集時間顯示累積完整率上升曲線
+
+    以分塊逐批累加各時間區間的非缺失計數 (見 update_completeness)，
+    freq 為時間區間 (固定長度的 pandas offset，如 '1h'、'1D'、'7D')，None 表示自動挑選。
+    """
+    with profile_stage('data prep'):
+        if freq is None:
+            times = load_columns([TIME_COLUMN])[TIME_COLUMN]
+            if times.notna().sum() == 0:
+                raise ValueError(f"資料缺少收集時間欄位 {TIME_COLUMN}，無法計算完整率曲線")
+            freq = _auto_bucket_freq(times.min(), times.max())
+            del times
+        state = None
+        for chunk in iter_data_chunks():
+            state = update_completeness(state, chunk.drop(columns=['Patient_ID'], errors='ignore'), freq=freq)
+    if state is None or state['counts'] is None:
+        raise ValueError(f"資料缺少收集時間欄位 {TIME_COLUMN}，無法計算完整率曲線")
+    return _completeness_figure(state, target)
+
+
+def _completeness_figure(state, target=80.0):
+    """由區間計數 state 繪製累積完整率曲線"""
+    import plotly.graph_objects as go
+    freq = state['freq']
+    curve = completeness_curve(state)
+    final_rate = curve['Overall'].iloc[-1]
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=curve.index, y=curve['Overall'], name='Overall', mode='lines+markers',
+        line=dict(color='#3498db', width=3), marker=dict(size=8), customdata=curve['Cumulative_Count'],
+        hovertemplate='Completeness: %{y:.1f}%<br>Records: %{customdata:,}<extra>Overall</extra>'))
+    # 仍有缺失的欄位各一條曲線，預設隱藏，可由圖例開啟
+    for field in state['fields']:
+        if curve[field].iloc[-1] < 100:
+            fig.add_trace(go.Scatter(x=curve.index, y=curve[field], name=field, mode='lines', visible='legendonly',
+                line=dict(width=1.5, dash='dot'), hovertemplate=f'{field}: %{{y:.1f}}%<extra></extra>'))
+    fig.add_hline(y=target, line_dash="dash", line_color="green", annotation_text=f"Target: {target:g}%", annotation_position="right")
+    fig.add_hline(y=final_rate, line_dash="dot", line_color="blue", annotation_text=f"Final: {final_rate:.1f}%", annotation_position="left")
+    fig.update_layout(title=f'<b>Data Collection Animation</b><br>Cumulative Completeness Rate Over Time (N={int(curve["Cumulative_Count"].iloc[-1]):,}, per {freq})',
+        xaxis_title='Collection Time', yaxis_title='Completeness Rate (%)', yaxis=dict(range=[0, 100]),
+        height=600, template='plotly_white', showlegend=True, hovermode='x unified')
     return fig
 
-def create_sunburst():
-    """創建階層式 Sunburst 圖"""
-    df_complete = df.dropna(subset=['Accept', 'Drug', 'Department'])
-    fig = px.sunburst(df_complete, path=['Department', 'Drug', 'Accept'], title='<b>Hierarchical Distribution</b><br>Department -> Drug -> Acceptance',
-        color='Accept', color_discrete_map={'Yes': '#27ae60', 'No': '#e74c3c', 'Unknown': '#3498db'})
-    fig.update_traces(textinfo='label+percent parent', hovertemplate='<b>%{label}</b><br>Count: %{value}<br>Percentage: %{percentParent}<extra></extra>')
-    fig.update_layout(height=700, template='plotly_white')
+SUNBURST_LEVELS = ('Department', 'Drug', 'Accept')
+ACCEPT_COLORS = {'Yes': '#27ae60', 'No': '#e74c3c', 'Unknown': '#3498db'}
+# {(資料識別, levels): (cube, 有缺失值的層級)}，只保留目前資料來源、至多 CUBE_CACHE_MAX_ENTRIES 個 (最近使用優先)
+_CUBE_CACHE = {}
+CUBE_CACHE_MAX_ENTRIES = 8
+
+
+def _data_identity():
+    """目前資料來源的識別，供記憶體內快取比對
+
+    檔案以路徑、大小、修改時間；模擬資料以參數；其他記憶體內 frame (_using_frame) 以物件 id。
+    模擬資料由參數決定，識別不依賴 df 是否已產生，第一次掃描 (會產生 df) 前後的識別相同。
+    """
+    if DATA_STORE is not None:
+        stat = os.stat(DATA_STORE)
+        return ('store', os.path.abspath(DATA_STORE), stat.st_size, stat.st_mtime_ns)
+    if _SYNTHETIC is not None:
+        return ('synthetic', _SYNTHETIC)
+    return ('frame', id(df))
+
+
+def hierarchy_cube(levels=SUNBURST_LEVELS):
+    """各類別路徑的筆數 (以 levels 為 MultiIndex 的 Series)，分塊以 categorical groupby 累加
+
+    結果依資料來源快取；已快取較細的 cube (如再加上 Time、Gender) 且多出的層級沒有缺失值時，
+    直接由其加總，不需重新掃描資料 (較細的 cube 不含多出層級缺失的列，有缺失時加總會少算)。
+    任一層級缺失的列不計入。
+    """
+    levels = tuple(levels)
+    identity = _data_identity()
+    for key in [key for key in _CUBE_CACHE if key[0] != identity]:
+        del _CUBE_CACHE[key]
+    for key, (cube, null_levels) in list(_CUBE_CACHE.items()):
+        cached_levels = key[1]
+        if set(levels) <= set(cached_levels) and not (set(cached_levels) - set(levels)) & null_levels:
+            _CUBE_CACHE[key] = _CUBE_CACHE.pop(key)
+            if cached_levels == levels:
+                return cube
+            return cube.groupby(level=list(levels), observed=True, sort=False).sum()
+    cube, null_levels = None, set()
+    for chunk in iter_data_chunks(list(levels)):
+        null_levels |= {level for level in levels if chunk[level].hasnans}
+        cube = update_hierarchy_cube(cube, chunk, levels)
+    if cube is None:
+        raise ValueError("資料為空，無法計算階層計數")
+    _CUBE_CACHE[(identity, levels)] = (cube, null_levels)
+    while len(_CUBE_CACHE) > CUBE_CACHE_MAX_ENTRIES:
+        del _CUBE_CACHE[next(iter(_CUBE_CACHE))]
+    return cube
+
+
+def update_hierarchy_cube(cube, batch, levels=SUNBURST_LEVELS):
+    """將一批資料的類別路徑筆數累加到 cube (第一次呼叫傳入 cube=None)"""
+    counts = batch.groupby(list(levels), observed=True).size()
+    if cube is not None:
+        counts = cube.add(counts, fill_value=0)
+    return counts[counts > 0].astype(np.int64)
+
+
+def _sunburst_nodes(cube):
+    """由 cube 產生 go.Sunburst 的 ids / labels / parents / values (父節點值為子節點總和)"""
+    ids, labels, parents, values = [], [], [], []
+    names = list(cube.index.names)
+    for depth in range(1, len(names) + 1):
+        level_counts = cube.groupby(level=names[:depth], observed=True).sum()
+        for path, count in level_counts.items():
+            path = [str(key) for key in (path if isinstance(path, tuple) else (path,))]
+            ids.append('/'.join(path))
+            labels.append(path[-1])
+            parents.append('/'.join(path[:-1]))
+            values.append(int(count))
+    return ids, labels, parents, values
+
+
+def create_sunburst(levels=SUNBURST_LEVELS):
+    """創建階層式 Sunburst 圖
+
+    由預先彙總的 hierarchy_cube 建立節點，建置時間與輸出大小只取決於類別路徑數量而非資料筆數。
+    """
+    with profile_stage('data prep'):
+        cube = hierarchy_cube(levels)
+    return _sunburst_figure(cube)
+
+
+def _sunburst_figure(cube):
+    """由 hierarchy cube 繪製 Sunburst 圖 (層級為 cube 的 index 名稱)"""
+    import plotly.graph_objects as go
+    from plotly.colors import qualitative
+    levels = list(cube.index.names)
+    ids, labels, parents, values = _sunburst_nodes(cube)
+    # 最外層為 Accept 時依接受度著色，內層節點沿用頂層節點的顏色
+    palette = qualitative.Plotly
+    top_colors = {}
+    colors = []
+    for node_id, label, parent in zip(ids, labels, parents):
+        if not parent:
+            top_colors[node_id] = palette[len(top_colors) % len(palette)]
+            colors.append(top_colors[node_id])
+        elif levels[-1] == 'Accept' and node_id.count('/') == len(levels) - 1:
+            colors.append(ACCEPT_COLORS.get(label, '#95a5a6'))
+        else:
+            colors.append(top_colors[node_id.split('/', 1)[0]])
+    fig = go.Figure(go.Sunburst(
+        ids=ids, labels=labels, parents=parents, values=values, branchvalues='total',
+        marker=dict(colors=colors), textinfo='label+percent parent',
+        hovertemplate='<b>%{label}</b><br>Count: %{value}<br>Percentage: %{percentParent}<extra></extra>'
+    ))
+    fig.update_layout(title='<b>Hierarchical Distribution</b><br>' + ' -> '.join(
+        'Acceptance' if level == 'Accept' else level for level in levels),
+        height=700, template='plotly_white')
     return fig
 
-def create_parallel_coordinates():
-    """創建平行座標圖"""
-    df_complete = df.dropna(subset=['Accept']).copy()
-    df_complete.loc[:, 'Drug_Code'] = pd.Categorical(df_complete['Drug']).codes
-    df_complete.loc[:, 'Dept_Code'] = pd.Categorical(df_complete['Department']).codes
+
+def create_parallel_coordinates(reduce=None, point_budget=DEFAULT_POINT_BUDGET):
+    """創建平行座標圖 (reduce='sample' 以分層抽樣限制在 point_budget 條線內)"""
+    import plotly.graph_objects as go
+    if reduce not in (None, 'sample'):
+        raise ValueError(f"平行座標圖僅支援 reduce=None 或 'sample'，收到 {reduce!r}")
     accept_map = {'Yes': 1, 'No': 0, 'Unknown': 0.5} 
-    df_complete.loc[:, 'Accept_Code'] = df_complete['Accept'].map(accept_map)
+    with profile_stage('data prep'):
+        data = load_columns(['Accept', 'Age', 'Dose', 'Level', 'Drug', 'Department'])
+        df_complete = complete_rows(data, ['Accept'])
+        n_complete = len(df_complete)
+        if reduce == 'sample':
+            df_complete = stratified_sample(df_complete, point_budget)
+        # 類別軸直接使用 category codes，刻度標籤即共用的類別表
+        drug = df_complete['Drug'].astype('category')
+        department = df_complete['Department'].astype('category')
+        accept = df_complete['Accept'].astype('category')
+        accept_lookup = np.array([accept_map.get(c, np.nan) for c in accept.cat.categories], dtype=np.float32)
+        accept_code = accept_lookup[accept.cat.codes.to_numpy()]
     color_map = [[0, '#e74c3c'], [0.5, '#f39c12'], [1, '#27ae60']]
-    fig = go.Figure(data=go.Parcoords(line=dict(color=df_complete['Accept_Code'], colorscale=color_map, showscale=True, cmin=0, cmax=1,
+    fig = go.Figure(data=go.Parcoords(line=dict(color=accept_code, colorscale=color_map, showscale=True, cmin=0, cmax=1,
             colorbar=dict(title="Accept", tickvals=[0, 1], ticktext=['No', 'Yes'])),
             dimensions=[
-                dict(range=[df_complete['Age'].min(), df_complete['Age'].max()], label='Age', values=df_complete['Age']),
-                dict(range=[df_complete['Dose'].min(), df_complete['Dose'].max()], label='Dose', values=df_complete['Dose']),
-                dict(range=[df_complete['Level'].min(), df_complete['Level'].max()], label='Level', values=df_complete['Level']),
-                dict(range=[0, df_complete['Drug_Code'].max()], label='Drug', values=df_complete['Drug_Code'],
-                     tickvals=list(range(df_complete['Drug_Code'].max() + 1)), ticktext=df_complete.groupby('Drug_Code')['Drug'].first().tolist()),
-                dict(range=[0, df_complete['Dept_Code'].max()], label='Department', values=df_complete['Dept_Code'],
-                     tickvals=list(range(df_complete['Dept_Code'].max() + 1)), ticktext=df_complete.groupby('Dept_Code')['Department'].first().tolist()),
+                dict(range=[df_complete['Age'].min(), df_complete['Age'].max()], label='Age', values=df_complete['Age'].to_numpy()),
+                dict(range=[df_complete['Dose'].min(), df_complete['Dose'].max()], label='Dose', values=df_complete['Dose'].to_numpy()),
+                dict(range=[df_complete['Level'].min(), df_complete['Level'].max()], label='Level', values=df_complete['Level'].to_numpy()),
+                dict(range=[0, len(drug.cat.categories) - 1], label='Drug', values=drug.cat.codes.to_numpy(),
+                     tickvals=list(range(len(drug.cat.categories))), ticktext=list(drug.cat.categories)),
+                dict(range=[0, len(department.cat.categories) - 1], label='Department', values=department.cat.codes.to_numpy(),
+                     tickvals=list(range(len(department.cat.categories))), ticktext=list(department.cat.categories)),
             ]
         )
     )
-    fig.update_layout(title='<b>Parallel Coordinates Plot</b><br>Multi-dimensional Data Analysis', height=600, template='plotly_white')
+    subtitle = 'Multi-dimensional Data Analysis'
+    if reduce == 'sample':
+        subtitle += f' - {_sampling_note(len(df_complete), n_complete)}'
+    fig.update_layout(title=f'<b>Parallel Coordinates Plot</b><br>{subtitle}', height=600, template='plotly_white')
     return fig
 
-def create_interactive_power_analysis():
-    """創建互動式統計檢定力分析 - 右側邊界優化，避免標註文字裁切"""
-    n_total = 1745
-    sample_sizes = np.linspace(1000, n_total, 50)
-    power = np.sqrt(sample_sizes / n_total)
+# 統計檢定力：由資料中觀察到的效果量計算檢定力曲線
+# proportion: 兩科別 Accept=Yes 比例差 (雙尾 z 檢定)；mean: 兩藥物 Level 平均差 (Welch 檢定，常態近似)
+POWER_ALPHA = 0.05
+POWER_TARGET = 0.8
+POWER_METHODS = ('closed', 'monte_carlo')
+
+
+def _norm_cdf(x):
+    """標準常態累積分布函數 (逐元素)"""
+    return 0.5 * np.vectorize(math.erfc, otypes=[np.float64])(-np.asarray(x, dtype=np.float64) / math.sqrt(2))
+
+
+def observed_effect_sizes():
+    """分塊累加各科別的 Accept 計數與各藥物的 Level 總和，回傳所有兩兩比較的觀察效果量
+
+    每個比較為 dict：kind ('proportion' / 'mean')、name、observed_n (兩組總筆數)、
+    ratio (第二組 / 第一組筆數)，以及 p1, p2 或 mean1, mean2, sd1, sd2。
+    """
+    accept = None
+    level = None
+    for chunk in iter_data_chunks(['Department', 'Accept', 'Drug', 'Level']):
+        answered = chunk['Accept'].isin(['Yes', 'No'])
+        counts = pd.DataFrame({'Yes': (chunk['Accept'] == 'Yes').to_numpy(), 'Answered': answered.to_numpy()},
+                              index=chunk.index).groupby(chunk['Department'], observed=True).sum()
+        accept = counts if accept is None else accept.add(counts, fill_value=0)
+        values = chunk['Level'].astype(np.float64)
+        sums = pd.DataFrame({'N': values.notna(), 'Sum': values, 'SumSq': values ** 2}).groupby(
+            chunk['Drug'], observed=True).sum()
+        level = sums if level is None else level.add(sums, fill_value=0)
+    if accept is None:
+        raise ValueError("資料為空，無法計算檢定力")
+
+    comparisons = []
+    accept = accept[accept['Answered'] > 0]
+    rates = accept['Yes'] / accept['Answered']
+    for i, a in enumerate(accept.index):
+        for b in accept.index[i + 1:]:
+            comparisons.append(dict(kind='proportion', name=f'Accept: {a} vs {b}',
+                                    observed_n=int(accept.at[a, 'Answered'] + accept.at[b, 'Answered']),
+                                    ratio=float(accept.at[b, 'Answered'] / accept.at[a, 'Answered']),
+                                    p1=float(rates[a]), p2=float(rates[b])))
+    level = level[level['N'] > 1]
+    means = level['Sum'] / level['N']
+    sds = np.sqrt(((level['SumSq'] - level['N'] * means ** 2) / (level['N'] - 1)).clip(lower=0))
+    for i, a in enumerate(level.index):
+        for b in level.index[i + 1:]:
+            comparisons.append(dict(kind='mean', name=f'Level: {a} vs {b}',
+                                    observed_n=int(level.at[a, 'N'] + level.at[b, 'N']),
+                                    ratio=float(level.at[b, 'N'] / level.at[a, 'N']),
+                                    mean1=float(means[a]), mean2=float(means[b]),
+                                    sd1=float(sds[a]), sd2=float(sds[b])))
+    return comparisons
+
+
+def effect_size(comparison):
+    """標準化效果量：比例為 Cohen's h，平均為 Cohen's d"""
+    if comparison['kind'] == 'proportion':
+        return abs(2 * math.asin(math.sqrt(comparison['p1'])) - 2 * math.asin(math.sqrt(comparison['p2'])))
+    pooled = math.sqrt((comparison['sd1'] ** 2 + comparison['sd2'] ** 2) / 2)
+    return abs(comparison['mean1'] - comparison['mean2']) / pooled if pooled > 0 else 0.0
+
+
+def _group_sizes(comparison, sample_sizes):
+    """依觀察到的兩組比例將總樣本數分配到兩組 (每組至少 2 筆)"""
+    n = np.asarray(sample_sizes, dtype=np.float64)
+    n1 = np.maximum(np.round(n / (1 + comparison['ratio'])), 2)
+    n2 = np.maximum(n - n1, 2)
+    return n1, n2
+
+
+def power_closed_form(comparison, sample_sizes, alpha=POWER_ALPHA):
+    """常態近似的雙尾檢定力 (逐一對應 sample_sizes 的總樣本數)"""
+    from statistics import NormalDist
+    z_crit = NormalDist().inv_cdf(1 - alpha / 2)
+    n1, n2 = _group_sizes(comparison, sample_sizes)
+    if comparison['kind'] == 'proportion':
+        p1, p2 = comparison['p1'], comparison['p2']
+        pooled = (p1 * n1 + p2 * n2) / (n1 + n2)
+        se0 = np.sqrt(pooled * (1 - pooled) * (1 / n1 + 1 / n2))
+        se1 = np.sqrt(p1 * (1 - p1) / n1 + p2 * (1 - p2) / n2)
+        diff = abs(p1 - p2)
+    else:
+        se0 = se1 = np.sqrt(comparison['sd1'] ** 2 / n1 + comparison['sd2'] ** 2 / n2)
+        diff = abs(comparison['mean1'] - comparison['mean2'])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        power = _norm_cdf((diff - z_crit * se0) / se1) + _norm_cdf((-diff - z_crit * se0) / se1)
+    # 兩組皆無變異時無法檢定，差異存在即必然顯著
+    return np.where(se1 > 0, power, float(diff > 0))
+
+
+def _monte_carlo_power(comparison, sample_sizes, replicates, alpha, seed):
+    """單一比較的 Monte-Carlo 檢定力：所有樣本數 × 重複次數以一次 (S, R) 陣列運算模擬"""
+    from statistics import NormalDist
+    rng = np.random.default_rng(seed)
+    z_crit = NormalDist().inv_cdf(1 - alpha / 2)
+    n1, n2 = _group_sizes(comparison, sample_sizes)
+    n1, n2 = n1[:, None], n2[:, None]
+    shape = (len(n1), replicates)
+    if comparison['kind'] == 'proportion':
+        x1 = rng.binomial(n1.astype(np.int64), comparison['p1'], size=shape)
+        x2 = rng.binomial(n2.astype(np.int64), comparison['p2'], size=shape)
+        pooled = (x1 + x2) / (n1 + n2)
+        diff = x1 / n1 - x2 / n2
+        se = np.sqrt(pooled * (1 - pooled) * (1 / n1 + 1 / n2))
+    else:
+        # 常態資料的樣本平均與樣本變異數可直接抽樣，不需產生逐筆資料
+        sd1, sd2 = comparison['sd1'], comparison['sd2']
+        diff = (rng.normal(comparison['mean1'], sd1 / np.sqrt(n1), size=shape)
+                - rng.normal(comparison['mean2'], sd2 / np.sqrt(n2), size=shape))
+        var1 = sd1 ** 2 * rng.chisquare(n1 - 1, size=shape) / (n1 - 1)
+        var2 = sd2 ** 2 * rng.chisquare(n2 - 1, size=shape) / (n2 - 1)
+        se = np.sqrt(var1 / n1 + var2 / n2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        reject = np.where(se > 0, np.abs(diff) > z_crit * se, diff != 0)
+    return reject.mean(axis=1)
+
+
+def _monte_carlo_block(comparisons, sample_sizes, replicates, alpha, seeds):
+    return np.array([_monte_carlo_power(c, sample_sizes, replicates, alpha, seed)
+                     for c, seed in zip(comparisons, seeds)])
+
+
+def power_monte_carlo(comparisons, sample_sizes, replicates=2000, alpha=POWER_ALPHA, seed=0, jobs=1):
+    """多個比較的 Monte-Carlo 檢定力，回傳 (比較數, 樣本數) 陣列
+
+    每個比較使用 SeedSequence 衍生的獨立亂數流，結果與 jobs 無關；
+    jobs > 1 時將比較分組交給 process pool 平行模擬。
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    sample_sizes = np.asarray(sample_sizes, dtype=np.float64)
+    seeds = np.random.SeedSequence(seed).spawn(len(comparisons))
+    if jobs <= 1 or len(comparisons) <= 1:
+        return _monte_carlo_block(comparisons, sample_sizes, replicates, alpha, seeds).reshape(
+            len(comparisons), len(sample_sizes))
+    blocks = [block for block in np.array_split(np.arange(len(comparisons)), jobs) if len(block)]
+    with ProcessPoolExecutor(max_workers=len(blocks)) as pool:
+        futures = [pool.submit(_monte_carlo_block, [comparisons[i] for i in block], sample_sizes,
+                               replicates, alpha, [seeds[i] for i in block])
+                   for block in blocks]
+        return np.concatenate([future.result() for future in futures])
+
+
+def create_interactive_power_analysis(method='closed', replicates=2000, alpha=POWER_ALPHA, jobs=1):
+    """創建互動式統計檢定力分析 - 右側邊界優化，避免標註文字裁切
+
+    以資料中觀察到的效果量計算檢定力曲線 (見 observed_effect_sizes)：
+    各類比較 (科別間 Accept 比例、藥物間 Level 平均) 各畫效果量最大的一組，星號標示目前樣本數。
+    method='closed' 使用常態近似公式，'monte_carlo' 以 replicates 次模擬估計 (jobs > 1 時平行)。
+    沒有可比較的組別時 (如只有一個科別、每種藥物至多 1 筆) 回傳附說明的空白圖。
+    """
+    import plotly.graph_objects as go
+    if method not in POWER_METHODS:
+        raise ValueError(f"method 必須是 {POWER_METHODS} 之一，收到 {method!r}")
+    with profile_stage('data prep'):
+        effects = observed_effect_sizes()
+        comparisons = [max(group, key=effect_size)
+                       for group in ([c for c in effects if c['kind'] == kind] for kind in ('proportion', 'mean'))
+                       if group]
+        max_n = max([c['observed_n'] for c in comparisons], default=0)
+        sample_sizes = np.unique(np.geomspace(20, max(max_n * 2, 40), 60).round())
+        if not comparisons:
+            power, current = [], []
+        elif method == 'closed':
+            power = np.array([power_closed_form(c, sample_sizes, alpha) for c in comparisons])
+            current = [float(power_closed_form(c, [c['observed_n']], alpha)[0]) for c in comparisons]
+        else:
+            power = power_monte_carlo(comparisons, sample_sizes, replicates, alpha, jobs=jobs)
+            current = [float(power_monte_carlo([c], [c['observed_n']], replicates, alpha)[0, 0])
+                       for c in comparisons]
+    
+    colors = ['#3498db', '#9b59b6']
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=sample_sizes, y=power, mode='lines', name='Statistical Power',
-        line=dict(color='#3498db', width=4), fill='tonexty', fillcolor='rgba(52, 152, 219, 0.2)',
-        hovertemplate='Sample Size: %{x:.0f}<br>Power: %{y:.2%}<extra></extra>'))
-    fig.add_hline(y=1.0, line_dash="dash", line_color="green", annotation_text="Target: 100%", annotation_position="right")
-    fig.add_trace(go.Scatter(x=[1417], y=[np.sqrt(1417/n_total)], mode='markers', name='Current State',
-        marker=dict(size=15, color='#e74c3c', symbol='star'), hovertemplate='Current: 1,417 samples<br>Power: %{y:.2%}<extra></extra>'))
-    fig.add_trace(go.Scatter(x=[n_total], y=[1.0], mode='markers', name='Full Dataset',
-        marker=dict(size=15, color='#27ae60', symbol='star'), hovertemplate='Full: 1,745 samples<br>Power: 100%<extra></extra>'))
+    for comparison, curve, now, color in zip(comparisons, power, current, colors):
+        label = f"{comparison['name']} ({'h' if comparison['kind'] == 'proportion' else 'd'}={effect_size(comparison):.3f})"
+        fig.add_trace(go.Scatter(x=sample_sizes, y=curve, mode='lines', name=label,
+            line=dict(color=color, width=4),
+            hovertemplate='Sample Size: %{x:.0f}<br>Power: %{y:.2%}<extra></extra>'))
+        fig.add_trace(go.Scatter(x=[comparison['observed_n']], y=[now], mode='markers', name=f'Current: {comparison["observed_n"]:,}',
+            marker=dict(size=15, color=color, symbol='star', line=dict(width=1, color='#2c3e50')),
+            hovertemplate=f'Current: {comparison["observed_n"]:,} samples<br>Power: %{{y:.2%}}<extra></extra>'))
+    if not comparisons:
+        fig.add_annotation(text='Not enough data to compare groups<br>'
+                                '(needs 2+ departments with Accept answers or 2+ drugs with 2+ Level values)',
+                           xref='paper', yref='paper', x=0.5, y=0.5, showarrow=False, font=dict(size=16))
+    fig.add_hline(y=POWER_TARGET, line_dash="dash", line_color="green", annotation_text=f"Target: {POWER_TARGET:.0%}",
+                  annotation_position="right")
+    subtitle = 'closed form' if method == 'closed' else f'Monte-Carlo, {replicates:,} replicates'
     fig.update_layout(
-        title='<b>Interactive Statistical Power Analysis</b><br>Sample Size vs Statistical Power',
+        title=f'<b>Interactive Statistical Power Analysis</b><br>Sample Size vs Statistical Power (alpha={alpha}, {subtitle})',
         xaxis_title='Sample Size (n)', yaxis_title='Statistical Power', height=600, template='plotly_white',
-        hovermode='x unified', yaxis=dict(tickformat='.0%'),
-        margin=dict(l=50, r=100, t=50, b=50), 
+        hovermode='x unified', xaxis=dict(type='log'), yaxis=dict(tickformat='.0%', range=[0, 1.05]),
+        margin=dict(l=50, r=100, t=80, b=50), 
         legend=dict(orientation="v", yanchor="top", y=0.99, xanchor="left", x=0.01, bgcolor="rgba(255, 255, 255, 0.7)")
     )
     return fig
 
+# ============================================
+# 圖表輸出 (共用 plotly.js + base64 typed array)
+# ============================================
+
+# 短於此長度的陣列 (range、tickvals 等) 保持 JSON 清單
+TYPED_ARRAY_MIN_LENGTH = 16
+_TYPED_ARRAY_SKIP_KEYS = {'range', 'tickvals', 'ticktext', 'colorscale'}
+
+
+def _typed_array_spec(values):
+    """數值陣列轉為 plotly.js typed array 格式 {dtype, bdata}；非數值或過短時回傳 None"""
+    arr = np.asarray(values)
+    if arr.ndim != 1 or len(arr) < TYPED_ARRAY_MIN_LENGTH:
+        return None
+    if arr.dtype.kind == 'f':
+        arr = arr.astype('<f4', copy=False)
+    elif arr.dtype.kind in 'iu':
+        for dtype in ('<u1', '<i1', '<u2', '<i2', '<u4', '<i4'):
+            info = np.iinfo(dtype)
+            if arr.min() >= info.min and arr.max() <= info.max:
+                arr = arr.astype(dtype, copy=False)
+                break
+        else:
+            arr = arr.astype('<f8')
+    else:
+        return None
+    return {'dtype': arr.dtype.str[1:], 'bdata': base64.b64encode(arr.tobytes()).decode('ascii')}
+
+
+def _encode_typed_arrays(obj):
+    """遞迴將 trace 內的數值陣列改為 base64 typed array (浮點數降為 float32)"""
+    if isinstance(obj, dict):
+        out = {}
+        for key, value in obj.items():
+            spec = None
+            if key not in _TYPED_ARRAY_SKIP_KEYS and isinstance(value, (list, tuple, np.ndarray)):
+                spec = _typed_array_spec(value)
+            out[key] = spec if spec is not None else _encode_typed_arrays(value)
+        return out
+    if isinstance(obj, list):
+        return [_encode_typed_arrays(v) for v in obj]
+    return obj
+
+
+def _compact_figure_dict(fig):
+    fig_dict = fig.to_dict()
+    fig_dict['data'] = [_encode_typed_arrays(trace) for trace in fig_dict.get('data', [])]
+    if 'frames' in fig_dict:
+        fig_dict['frames'] = [dict(frame, data=[_encode_typed_arrays(t) for t in frame.get('data', [])])
+                              for frame in fig_dict['frames']]
+    return fig_dict
+
+
+def write_chart_html(fig, path, compact=False, post_script=None):
+    """輸出單一圖表 HTML
+
+    compact=True 時 plotly.js 只寫一份 plotly.min.js 到輸出目錄並以 <script src> 引用，
+    數值陣列以 base64 typed array 編碼；否則與 fig.write_html 預設相同 (內嵌 plotly.js)。
+    """
+    import plotly.io as pio
+    with profile_stage('serialize'):
+        if compact:
+            html = pio.to_html(_compact_figure_dict(fig), include_plotlyjs='directory',
+                               post_script=post_script, validate=False)
+        else:
+            html = fig.to_html(post_script=post_script)
+    with profile_stage('write'):
+        if compact:
+            _ensure_plotly_bundle(os.path.dirname(os.path.abspath(path)))
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(html)
+    if _METRICS is not None:
+        count_metric('bytes_written', os.path.getsize(path))
+
+
+def _ensure_plotly_bundle(out_dir):
+    """確保輸出目錄中有共用的 plotly.min.js"""
+    from plotly.offline import get_plotlyjs
+
+    bundle_path = os.path.join(out_dir, 'plotly.min.js')
+    if not os.path.exists(bundle_path):
+        with open(bundle_path, 'w', encoding='utf-8') as f:
+            f.write(get_plotlyjs())
+
+
+def output_size(out_dir='.'):
+    """輸出目錄中 HTML 與 plotly.min.js 的總位元組數"""
+    return sum(os.path.getsize(os.path.join(out_dir, name)) for name in os.listdir(out_dir)
+               if name.endswith('.html') or name == 'plotly.min.js')
+
+
+# ============================================
+# 增量建置快取 (以資料、程式碼與參數雜湊定址)
+# ============================================
+
+_FILE_DIGEST_MEMO = {}
+_HASHABLE_CONSTANT_TYPES = (int, float, str, bool, tuple, list, dict, type(None))
+
+
+def data_fingerprint():
+    """目前資料來源的內容雜湊：模擬資料雜湊其參數，其他記憶體中的 df 逐列雜湊，檔案來源雜湊檔案內容"""
+    import hashlib
+    h = hashlib.blake2b(digest_size=16)
+    if DATA_STORE is None and _SYNTHETIC is not None:
+        # 模擬資料由 (筆數, 種子, 產生器原始碼) 決定：產生前後雜湊相同，也不需先產生
+        h.update(repr(_SYNTHETIC).encode('utf-8'))
+        _update_code_digest(h, generate_tdm_data, set())
+        return h.hexdigest()
+    if DATA_STORE is None:
+        h.update(repr(list(df.columns)).encode('utf-8'))
+        h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+        return h.hexdigest()
+    stat = os.stat(DATA_STORE)
+    memo_key = (os.path.abspath(DATA_STORE), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _FILE_DIGEST_MEMO:
+        with open(DATA_STORE, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        _FILE_DIGEST_MEMO[memo_key] = h.hexdigest()
+    return _FILE_DIGEST_MEMO[memo_key]
+
+
+def _code_names(code):
+    import inspect
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _code_names(const)
+    return names
+
+
+def _update_code_digest(h, func, seen):
+    """雜湊函數原始碼，並遞迴納入其引用的同模組函數與常數
+
+    只納入公開的全大寫常數；底線開頭或小寫的全域變數是執行期狀態 (資料、快取、效能分析)，不影響輸出。
+    """
+    import inspect
+    if func in seen:
+        return
+    seen.add(func)
+    h.update(inspect.getsource(func).encode('utf-8'))
+    for name in sorted(_code_names(func.__code__)):
+        value = func.__globals__.get(name)
+        if inspect.isfunction(value) and value.__module__ == func.__module__:
+            _update_code_digest(h, value, seen)
+        elif name.isupper() and not name.startswith('_') and isinstance(value, _HASHABLE_CONSTANT_TYPES):
+            h.update(f'{name}={value!r}'.encode('utf-8'))
+
+
+def chart_cache_key(chart, data_digest, compact=False, single_page=False, params=None):
+    """圖表輸出的快取鍵：資料雜湊 + 建立函數 (含相依函數) 原始碼 + 參數 + 輸出模式
+
+    params 為實際傳給建立函數的參數 (None 表示 chart['params'])。
+    """
+    import hashlib
+    import plotly
+    if params is None:
+        params = chart.get('params', {})
+    h = hashlib.sha256()
+    h.update(json.dumps([data_digest, chart['filename'], repr(sorted(params.items())),
+                         chart.get('post_script'), compact, single_page, plotly.__version__]).encode('utf-8'))
+    seen = set()
+    for func in (chart['builder'], write_chart_html, _figure_json):
+        _update_code_digest(h, func, seen)
+    return h.hexdigest()
+
+
+def _cache_entry_path(cache_dir, key, single_page):
+    return os.path.join(cache_dir, key + ('.json' if single_page else '.html'))
+
+
+def _restore_cached_output(entry, path, compact, single_page):
+    """由快取還原圖表輸出到 path (並更新 mtime 作為最近使用時間)"""
+    import shutil
+    os.utime(entry)
+    if single_page:
+        with open(entry, encoding='utf-8') as f:
+            return f.read()
+    shutil.copyfile(entry, path)
+    if compact:
+        _ensure_plotly_bundle(os.path.dirname(os.path.abspath(path)))
+    return None
+
+
+def _store_cached_output(entry, path, output, single_page):
+    import shutil
+    tmp_path = f'{entry}.{os.getpid()}.tmp'
+    if single_page:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        shutil.copyfile(path, tmp_path)
+    os.replace(tmp_path, entry)
+
+
+def prune_build_cache(cache_dir, max_bytes):
+    """刪除最久未使用的快取項目，直到總大小不超過 max_bytes，回傳刪除的項目數"""
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and entry.name.endswith(('.html', '.json')):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        os.remove(path)
+        total -= size
+        removed += 1
+    return removed
+
+
 # ============================================
 # 整合儀表板 (修正儀表板 HTML 錯誤)
 # ============================================
 
-def create_dashboard():
-    """創建完整的互動式儀表板"""
-    
-    print("生成互動式圖表...")
-    
-    try:
-        # 生成所有圖表 (使用優化後的函數)
-        fig1 = create_interactive_missing_analysis()
-        fig1.write_html('interactive_missing_analysis.html', auto_open=False)
-        print(" ... [OK] interactive_missing_analysis.html")
-        fig2 = create_3d_scatter()
-        fig2.write_html('interactive_3d_scatter.html', auto_open=False)
-        print("    [OK] interactive_3d_scatter.html (3D 圖例 V6 2D假圖例)")
-        fig3 = create_animated_data_collection()
-        fig3.write_html('interactive_animation.html', auto_open=False)
-        print("    [OK] interactive_animation.html")
-        fig4 = create_sunburst()
-        fig4.write_html('interactive_sunburst.html', auto_open=False)
-        print("    [OK] interactive_sunburst.html")
-        fig5 = create_parallel_coordinates()
-        fig5.write_html('interactive_parallel.html', auto_open=False)
-        print("    [OK] interactive_parallel.html")
-        fig6 = create_interactive_power_analysis()
-        fig6.write_html('interactive_power_analysis.html', auto_open=False)
-        print("    [OK] interactive_power_analysis.html (邊界優化)")
-        
-        # 創建整合儀表板 (iframe 寬高調整)
-        print()
-        print("創建整合儀表板 (修正分頁錯誤)...")
-        
-        # === 修正後的 dashboard_html 內容開始 ===
-        dashboard_html = """<!DOCTYPE html>
+DASHBOARD_TEMPLATE = string.Template("""<!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
@@ -378,6 +1858,7 @@ def create_dashboard():
         .drug-legend { background: #f8f9fa; padding: 15px; border-radius: 8px; margin-top: 20px; font-size: 0.9em; }
         .drug-table { display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 10px; }
         .chart-iframe { width: 100%; border: none; }
+        .chart-plot { width: 100%; }
 
     </style>
 </head>
@@ -405,21 +1886,17 @@ def create_dashboard():
         </div>
         
         <div class="nav">
-            <button class="nav-btn active" onclick="showChart(0)">1️⃣ 缺失值分析</button>
-            <button class="nav-btn" onclick="showChart(1)">2️⃣ 3D 散點圖</button>
-            <button class="nav-btn" onclick="showChart(2)">3️⃣ 數據收集動畫</button>
-            <button class="nav-btn" onclick="showChart(3)">4️⃣ 階層分布圖</button>
-            <button class="nav-btn" onclick="showChart(4)">5️⃣ 平行座標圖</button>
-            <button class="nav-btn" onclick="showChart(5)">6️⃣ 統計檢定力</button>
+$nav
         </div>
         
-        <div id="chart0" class="chart-container active">
-            <iframe src="interactive_missing_analysis.html" class="chart-iframe" height="600"></iframe>
-        </div>
-        
-        <div id="chart1" class="chart-container">
-            <iframe src="interactive_3d_scatter.html" class="chart-iframe" height="950"></iframe> 
-            <div class="drug-legend">
+$charts
+    </div>
+    
+$scripts
+</body>
+</html>""")
+
+DRUG_LEGEND_HTML = """            <div class="drug-legend">
                 <h3>📋 藥物代碼對照表</h3>
                 <p>3D 圖表使用縮寫以保持視覺清晰,完整名稱請參考下表或將滑鼠移到資料點上查看:</p>
                 <div class="drug-table">
@@ -431,30 +1908,45 @@ def create_dashboard():
                     <div class="drug-item"><strong>Li</strong> = Lithium</div>
                     <div class="drug-item"><strong>Tacro</strong> = Tacrolimus</div>
                     <div class="drug-item"><strong>Cyclo</strong> = Cyclosporine</div>
-                    <div class.container"><strong>Carba</strong> = Carbamazepine</div>
+                    <div class="drug-item"><strong>Carba</strong> = Carbamazepine</div>
                     <div class="drug-item"><strong>VPA</strong> = Valproic Acid</div>
                 </div>
             </div>
-        </div>
-        
-        <div id="chart2" class="chart-container">
-            <iframe src="interactive_animation.html" class="chart-iframe" height="700"></iframe>
-        </div>
-        
-        <div id="chart3" class="chart-container">
-            <iframe src="interactive_sunburst.html" class="chart-iframe" height="800"></iframe>
-        </div>
-        
-        <div id="chart4" class="chart-container">
-            <iframe src="interactive_parallel.html" class="chart-iframe" height="700"></iframe>
-        </div>
-        
-        <div id="chart5" class="chart-container">
-            <iframe src="interactive_power_analysis.html" class="chart-iframe" height="700"></iframe> 
-        </div>
-    </div>
-    
-    <script>
+"""
+
+# 儀表板圖表清單 (順序即分頁順序)；columns 為圖表讀取的欄位 (None 表示所有欄位，見 dashboard_columns)
+DASHBOARD_CHARTS = [
+    dict(name='missing', filename='interactive_missing_analysis.html', builder=create_interactive_missing_analysis,
+         label='1️⃣ 缺失值分析', height=600, columns=None),
+    dict(name='3d', filename='interactive_3d_scatter.html', builder=create_3d_scatter,
+         label='2️⃣ 3D 散點圖', height=950, note=' (3D 圖例 V6 2D假圖例)',
+         params=dict(single_trace='auto'), extra_html=DRUG_LEGEND_HTML, post_script=SCATTER3D_LEGEND_JS,
+         columns=['Drug', 'Age', 'Dose', 'Level', 'Accept'], reduce=('sample', 'voxel')),
+    dict(name='animation', filename='interactive_animation.html', builder=create_animated_data_collection,
+         label='3️⃣ 數據收集動畫', height=700, columns=None),
+    dict(name='sunburst', filename='interactive_sunburst.html', builder=create_sunburst,
+         label='4️⃣ 階層分布圖', height=800, columns=list(SUNBURST_LEVELS)),
+    dict(name='parallel', filename='interactive_parallel.html', builder=create_parallel_coordinates,
+         label='5️⃣ 平行座標圖', height=700, columns=['Accept', 'Age', 'Dose', 'Level', 'Drug', 'Department'],
+         reduce=('sample',)),
+    dict(name='power', filename='interactive_power_analysis.html', builder=create_interactive_power_analysis,
+         label='6️⃣ 統計檢定力', height=700, note=' (邊界優化)', columns=['Department', 'Accept', 'Drug', 'Level']),
+]
+
+
+
+def chart_params(chart, reduce=None, point_budget=DEFAULT_POINT_BUDGET):
+    """圖表建立函數的參數：chart['params'] 加上大量資料縮減設定
+
+    只套用到宣告 reduce 模式的圖表；圖表不支援所選模式 (如平行座標圖的 'voxel') 時改用 'sample'。
+    """
+    params = dict(chart.get('params', {}))
+    if reduce is not None and chart.get('reduce'):
+        params.update(reduce=reduce if reduce in chart['reduce'] else 'sample', point_budget=point_budget)
+    return params
+
+
+IFRAME_DASHBOARD_SCRIPT = """    <script>
         function showChart(index) {
             const charts = document.querySelectorAll('.chart-container');
             charts.forEach(chart => chart.classList.remove('active'));
@@ -465,32 +1957,922 @@ def create_dashboard():
             document.getElementById('chart' + index).classList.add('active');
             btns[index].classList.add('active');
         }
-    </script>
-</body>
-</html>"""
-        # === 修正後的 dashboard_html 內容結束 ===
-        
-        with open('interactive_dashboard.html', 'w', encoding='utf-8') as f:
-            f.write(dashboard_html)
-        
-        print("    [OK] interactive_dashboard.html (分頁錯誤已修正)")
-        print()
-        print("=" * 60)
+    </script>"""
+
+# 單頁模式：圖表 JSON 以 <script type="application/json"> 內嵌，第一次切換到該分頁時才解析與繪製
+SINGLE_PAGE_DASHBOARD_SCRIPT = """    <script>
+        const rendered = {};
+        const postScripts = {$post_scripts};
+
+        function renderChart(index) {
+            if (rendered[index]) { return; }
+            rendered[index] = true;
+            const el = document.getElementById('fig-data' + index);
+            const fig = JSON.parse(el.textContent);
+            el.remove();
+            fig.config = Object.assign({responsive: true}, fig.config || {});
+            Plotly.newPlot('plot' + index, fig).then(function() {
+                if (postScripts[index]) { postScripts[index](); }
+                if (window.onChartRendered) { window.onChartRendered(index); }
+            });
+        }
+
+        function showChart(index) {
+            const charts = document.querySelectorAll('.chart-container');
+            charts.forEach(chart => chart.classList.remove('active'));
+            
+            const btns = document.querySelectorAll('.nav-btn');
+            btns.forEach(btn => btn.classList.remove('active'));
+            
+            document.getElementById('chart' + index).classList.add('active');
+            btns[index].classList.add('active');
+            renderChart(index);
+        }
+
+        document.addEventListener('DOMContentLoaded', function() { renderChart(0); });
+    </script>"""
+
+
+def _render_dashboard(charts, chart_bodies, scripts):
+    nav = '\n'.join(
+        f'            <button class="nav-btn{" active" if i == 0 else ""}" onclick="showChart({i})">{chart["label"]}</button>'
+        for i, chart in enumerate(charts))
+    containers = '\n        \n'.join(
+        f'        <div id="chart{i}" class="chart-container{" active" if i == 0 else ""}">\n'
+        f'{body}{chart.get("extra_html", "")}        </div>'
+        for i, (chart, body) in enumerate(zip(charts, chart_bodies)))
+    return DASHBOARD_TEMPLATE.substitute(nav=nav, charts=containers, scripts=scripts)
+
+
+def write_iframe_dashboard(path='interactive_dashboard.html', charts=DASHBOARD_CHARTS):
+    """以 iframe 嵌入各圖表 HTML 的儀表板 (各圖表需另外輸出)"""
+    bodies = [f'            <iframe src="{chart["filename"]}" class="chart-iframe" height="{chart["height"]}"></iframe>\n'
+              for chart in charts]
+    with profile_stage('write'), open(path, 'w', encoding='utf-8') as f:
+        f.write(_render_dashboard(charts, bodies, IFRAME_DASHBOARD_SCRIPT))
+    if _METRICS is not None:
+        count_metric('bytes_written', os.path.getsize(path))
+
+
+def _figure_json(fig, compact=False):
+    import plotly.io as pio
+    return pio.to_json(_compact_figure_dict(fig), validate=False) if compact else fig.to_json()
+
+
+def write_single_page_dashboard(figures, path='interactive_dashboard.html', charts=DASHBOARD_CHARTS,
+                                compact=False):
+    """所有圖表放在同一頁、共用一個 Plotly runtime，圖表於第一次顯示時才繪製
+
+    figures 可為 go.Figure 或已序列化的 JSON 字串 (平行建置時由子程序回傳)。
+    """
+    from plotly.offline import get_plotlyjs
+
+    if compact:
+        _ensure_plotly_bundle(os.path.dirname(os.path.abspath(path)))
+        runtime = '    <script src="plotly.min.js"></script>'
+    else:
+        runtime = f'    <script type="text/javascript">{get_plotlyjs()}</script>'
+    html = _single_page_html(figures, charts, runtime, compact)
+    with profile_stage('write'), open(path, 'w', encoding='utf-8') as f:
+        f.write(html)
+    if _METRICS is not None:
+        count_metric('bytes_written', os.path.getsize(path))
+
+
+def _single_page_html(figures, charts, runtime, compact=False, extra_scripts=()):
+    """單頁式儀表板 HTML：runtime 為載入 Plotly 的 <script>，extra_scripts 附加在最後"""
+    bodies, data_blocks, post_scripts = [], [], []
+    for i, (chart, fig) in enumerate(zip(charts, figures)):
+        bodies.append(f'            <div id="plot{i}" class="chart-plot"></div>\n')
+        if isinstance(fig, str):
+            fig_json = fig
+        else:
+            with profile_stage('serialize'):
+                fig_json = _figure_json(fig, compact)
+        fig_json = fig_json.replace('</', '<\\/')
+        data_blocks.append(f'    <script type="application/json" id="fig-data{i}">{fig_json}</script>')
+        if chart.get('post_script'):
+            post_script = chart['post_script'].replace('{plot_id}', f'plot{i}')
+            post_scripts.append(f'{i}: function() {{ {post_script} }}')
+
+    scripts = '\n'.join([runtime] + data_blocks + [
+        string.Template(SINGLE_PAGE_DASHBOARD_SCRIPT).substitute(post_scripts=', '.join(post_scripts))]
+        + list(extra_scripts))
+    return _render_dashboard(charts, bodies, scripts)
+
+
+def _build_chart_output(chart, compact, single_page, out_dir, params=None):
+    """建立單一圖表 (params 為 None 時使用 chart['params'])；單頁模式回傳 JSON 字串，否則直接寫出 HTML"""
+    if params is None:
+        params = chart.get('params', {})
+    with chart_scope(chart['filename']):
+        with profile_stage('figure build'):
+            fig = chart['builder'](**params)
+        record_figure_metrics(fig)
+        if single_page:
+            with profile_stage('serialize'):
+                fig_json = _figure_json(fig, compact)
+            count_metric('bytes_serialized', len(fig_json))
+            return fig_json
+        write_chart_html(fig, os.path.join(out_dir, chart['filename']), compact=compact,
+                         post_script=chart.get('post_script'))
+        return None
+
+
+def _dashboard_worker(index, data_store, compact, single_page, out_dir='.', cache_entry=None, collect_metrics=False,
+                      params=None):
+    """建置 DASHBOARD_CHARTS[index]，錯誤以 traceback 字串回傳而非拋出 (亦作為子程序進入點)
+
+    collect_metrics=True 時 (子程序) 以新的 _METRICS 記錄此圖表並一併回傳，由主程序合併。
+    """
+    global DATA_STORE
+    DATA_STORE = data_store
+    if collect_metrics:
+        enable_metrics()
+    chart = DASHBOARD_CHARTS[index]
+    start = time.perf_counter()
+    try:
+        output = _build_chart_output(chart, compact, single_page, out_dir, params)
+        if cache_entry is not None:
+            _store_cached_output(cache_entry, os.path.join(out_dir, chart['filename']), output, single_page)
+        result = index, output, None, time.perf_counter() - start
+    except Exception:
+        result = index, None, traceback.format_exc(), time.perf_counter() - start
+    return result + (_METRICS if collect_metrics else None,)
+
+
+def _run_dashboard_charts(indices, compact, single_page, jobs, cache_entries, out_dir='.', params=None):
+    """依序或以 process pool 建置指定圖表，逐一產出 (index, output, error, 秒數)
+
+    params: {index: 建立函數參數}，未列出的圖表使用 chart['params']。
+    """
+    params = params or {}
+    import tempfile
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    if jobs <= 1 or len(indices) <= 1:
+        for i in indices:
+            yield _dashboard_worker(i, DATA_STORE, compact, single_page, out_dir, cache_entries.get(i),
+                                    params=params.get(i))[:4]
+        return
+
+    # 子程序透過 memory-mapped Arrow 檔共享資料，不逐一 pickle DataFrame
+    shared_store, tmp_path = DATA_STORE, None
+    if shared_store is None:
+        try:
+            _require_pyarrow()
+        except ImportError:
+            print("    [WARN] --jobs 需要 pyarrow 以 Arrow 檔與子程序共享資料 (pip install pyarrow)，改為依序建置")
+            yield from _run_dashboard_charts(indices, compact, single_page, 1, cache_entries, out_dir, params)
+            return
+        fd, tmp_path = tempfile.mkstemp(suffix='.arrow', dir=out_dir)
+        os.close(fd)
+        shared_store = write_arrow_store(get_df(), tmp_path)
+    try:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {pool.submit(_dashboard_worker, i, shared_store, compact, single_page, out_dir,
+                                   cache_entries.get(i), _METRICS is not None, params.get(i)): i
+                       for i in indices}
+            for future in as_completed(futures):
+                try:
+                    *result, metrics = future.result()
+                except Exception:
+                    yield futures[future], None, traceback.format_exc(), 0.0
+                    continue
+                if metrics is not None:
+                    merge_metrics(metrics)
+                yield tuple(result)
+    finally:
+        if tmp_path is not None:
+            os.remove(tmp_path)
+
+
+def create_dashboard(compact=False, single_page=False, jobs=1, cache_dir=None, cache_max_bytes=None,
+                     charts=None, out_dir='.', reduce=None, point_budget=DEFAULT_POINT_BUDGET):
+    """創建完整的互動式儀表板
+
+    compact=True: 共用 plotly.min.js + base64 typed array；
+    single_page=True: 不輸出個別圖表 HTML，所有圖表放在單一頁面並延遲繪製；
+    jobs > 1: 以 process pool 平行建置圖表；
+    cache_dir: 快取命中的圖表直接複製快取輸出，不呼叫 create_* 與 write_html，
+    cache_max_bytes 設定時完成後依最近使用時間淘汰超出大小的快取；
+    charts: 只建置指定名稱的圖表 (DASHBOARD_CHARTS 的 name)，None 表示全部；
+    out_dir: 輸出目錄；
+    reduce / point_budget: 大量資料縮減 ('sample' 或 'voxel'，見 chart_params)，None 表示輸出所有資料點。
+    回傳失敗圖表 {檔名: traceback}，單一圖表失敗不影響其他圖表與儀表板。
+    """
+    names = [chart['name'] for chart in DASHBOARD_CHARTS]
+    unknown = sorted(set(charts or []) - set(names))
+    if unknown:
+        raise ValueError(f"未知的圖表名稱: {', '.join(unknown)} (可用: {', '.join(names)})")
+    if reduce not in REDUCE_MODES:
+        raise ValueError(f"reduce 必須是 {REDUCE_MODES} 之一，收到 {reduce!r}")
+    selected = [i for i, name in enumerate(names) if charts is None or name in charts]
+    params = {i: chart_params(DASHBOARD_CHARTS[i], reduce, point_budget) for i in selected}
+    os.makedirs(out_dir, exist_ok=True)
+    dashboard_path = os.path.join(out_dir, 'interactive_dashboard.html')
+    
+    print(f"生成互動式圖表... (jobs={jobs})" if jobs > 1 else "生成互動式圖表...")
+    
+    outputs, failures, cache_entries = {}, {}, {}
+    pending = selected
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        data_digest = data_fingerprint()
+        pending = []
+        for i in selected:
+            chart = DASHBOARD_CHARTS[i]
+            key = chart_cache_key(chart, data_digest, compact, single_page, params[i])
+            entry = _cache_entry_path(cache_dir, key, single_page)
+            if os.path.exists(entry):
+                outputs[i] = _restore_cached_output(entry, os.path.join(out_dir, chart['filename']),
+                                                    compact, single_page)
+                with chart_scope(chart['filename']):
+                    count_metric('cache_hits')
+                print(f"    [CACHED] {chart['filename']}")
+            else:
+                cache_entries[i] = entry
+                pending.append(i)
+    
+    for index, output, error, elapsed in _run_dashboard_charts(pending, compact, single_page, jobs, cache_entries,
+                                                               out_dir, params):
+        chart = DASHBOARD_CHARTS[index]
+        if error is not None:
+            failures[chart['filename']] = error
+            with chart_scope(chart['filename']):
+                count_metric('build_failures')
+            print(f"    [FAIL] {chart['filename']} ({elapsed:.2f}s)")
+            print(error)
+            continue
+        outputs[index] = output
+        if not single_page:
+            print(f"    [OK] {chart['filename']}{chart.get('note', '')} ({elapsed:.2f}s)")
+    
+    # 儀表板只納入成功建置的圖表
+    built = sorted(outputs)
+    built_charts = [DASHBOARD_CHARTS[i] for i in built]
+    print()
+    try:
+        with chart_scope('interactive_dashboard.html'):
+            if single_page:
+                print("創建單頁式儀表板 (延遲載入)...")
+                write_single_page_dashboard([outputs[i] for i in built], dashboard_path,
+                                            charts=built_charts, compact=compact)
+                print("    [OK] interactive_dashboard.html (單一 Plotly runtime)")
+            else:
+                # 創建整合儀表板 (iframe 寬高調整)
+                print("創建整合儀表板 (修正分頁錯誤)...")
+                write_iframe_dashboard(dashboard_path, charts=built_charts)
+                print("    [OK] interactive_dashboard.html (分頁錯誤已修正)")
+            if compact:
+                print(f"    輸出總大小: {output_size(out_dir) / 1e6:.1f} MB (共用 plotly.min.js)")
+    except Exception:
+        failures['interactive_dashboard.html'] = traceback.format_exc()
+        print("    [FAIL] interactive_dashboard.html")
+        print(failures['interactive_dashboard.html'])
+    
+    if cache_dir is not None and cache_max_bytes is not None:
+        removed = prune_build_cache(cache_dir, cache_max_bytes)
+        if removed:
+            print(f"    快取淘汰 {removed} 個項目 (上限 {cache_max_bytes / 1e6:.0f} MB)")
+    
+    print()
+    print("=" * 60)
+    if failures:
+        print(f"[ERROR] {len(failures)} 個輸出失敗: {', '.join(failures)}")
+    else:
         print("[SUCCESS] 所有互動式圖表生成完成!")
         print("本次修正了儀表板分頁錯誤，並使用 2D 假圖例確保 3D 圖例文字完整。")
-        print("請用瀏覽器開啟 interactive_dashboard.html 查看最終效果!")
-        print("=" * 60)
-        
-    except Exception as e:
-        print()
-        print("[ERROR] 生成過程發生錯誤:")
-        print(str(e))
-        import traceback
-        traceback.print_exc()
+        print(f"請用瀏覽器開啟 {dashboard_path} 查看最終效果!")
+    print("=" * 60)
+    return failures
+
+# ============================================
+# 批次切片儀表板 (時間區間 × 科別)
+# ============================================
+
+def build_slice_index(data, time_column=TIME_COLUMN, group_column='Department'):
+    """將資料依 (科別, 收集時間) 排序一次並記錄各科別的列範圍
+
+    排序後每個 (科別, 時間區間) 切片都是連續的列範圍，可直接以 iloc 取得而不需逐切片篩選；
+    類別欄位的編碼由所有切片共用。group_column=None 時只依收集時間排序 (切片不分科別)。
+    """
+    times = data[time_column].to_numpy(dtype='datetime64[ns]')
+    if group_column is None:
+        order = np.argsort(times, kind='stable')
+        return {'frame': data.take(order), 'times': times[order], 'group_column': None,
+                'time_column': time_column, 'groups': {None: (0, len(data))}}
+    groups = data[group_column].astype('category')
+    codes = groups.cat.codes.to_numpy()
+    order = np.lexsort((times, codes))
+    frame = data.take(order)
+    codes, times = codes[order], times[order]
+    levels = list(groups.cat.categories)
+    bounds = np.searchsorted(codes, np.arange(len(levels) + 1))
+    return {'frame': frame, 'times': times, 'group_column': group_column, 'time_column': time_column,
+            'groups': {level: (int(bounds[i]), int(bounds[i + 1])) for i, level in enumerate(levels)}}
+
+
+def slice_rows(index, start=None, end=None, group=None):
+    """取出 [start, end) 時間區間、group 科別 (None 表示全部科別) 的列
+
+    回傳排序後資料的連續範圍 (不複製資料)；唯一的例外是依科別排序的索引 (group_column 不為 None)
+    卻不指定科別，此時須合併各科別的範圍而複製資料。
+    """
+    times = index['times']
+    groups = [group] if group is not None else list(index['groups'])
+    ranges = []
+    for level in groups:
+        lo, hi = index['groups'][level]
+        first = lo if start is None else lo + np.searchsorted(times[lo:hi], np.datetime64(start, 'ns'))
+        last = hi if end is None else lo + np.searchsorted(times[lo:hi], np.datetime64(end, 'ns'))
+        if last > first:
+            ranges.append((first, last))
+    if len(ranges) == 1:
+        return index['frame'].iloc[ranges[0][0]:ranges[0][1]]
+    positions = np.concatenate([np.arange(a, b) for a, b in ranges]) if ranges else np.array([], dtype=np.intp)
+    return index['frame'].take(positions)
+
+
+# 切片標籤會作為目錄名稱：路徑分隔符與 Windows 不允許的字元一律換成底線
+_LABEL_UNSAFE_CHARS = str.maketrans({char: '_' for char in ' /\\:*?"<>|'})
+
+
+def period_slices(index, freq='M', by_group=True):
+    """依 freq (pandas period，如 'M'、'Q') 切出時間區間；by_group=True 時再依科別細分
+
+    回傳 [{'label', 'start', 'end', 'group'}]；label 可直接作為目錄名稱 (如週期 '2024-01-01/2024-01-07'
+    轉為 '2024-01-01_2024-01-07')。
+    """
+    times = index['times']
+    valid = times[~np.isnat(times)]
+    if len(valid) == 0:
+        raise ValueError(f"資料缺少收集時間欄位 {index['time_column']}，無法依時間切片")
+    if by_group and index['group_column'] is None:
+        raise ValueError("索引未依科別排序 (group_column=None)，無法依科別切片")
+    periods = pd.period_range(valid.min(), valid.max(), freq=freq)
+    groups = list(index['groups']) if by_group else [None]
+    slices = []
+    for period in periods:
+        for group in groups:
+            label = str(period) if group is None else f'{period}_{group}'
+            slices.append(dict(label=label.translate(_LABEL_UNSAFE_CHARS), start=period.start_time,
+                               end=(period + 1).start_time, group=group))
+    return slices
+
+
+def dashboard_columns(charts=None):
+    """所選圖表 (DASHBOARD_CHARTS 的 name，None 表示全部) 需要的欄位；任一圖表需要所有欄位時回傳 None"""
+    columns = []
+    for chart in DASHBOARD_CHARTS:
+        if charts is not None and chart['name'] not in charts:
+            continue
+        if chart.get('columns') is None:
+            return None
+        columns += chart['columns']
+    return list(dict.fromkeys(columns))
+
+
+@contextlib.contextmanager
+def _using_frame(frame):
+    """暫時以記憶體中的 frame 作為所有圖表的資料來源 (不視為模擬資料，快取鍵逐列雜湊 frame)"""
+    global df, DATA_STORE, _SYNTHETIC
+    saved = df, DATA_STORE, _SYNTHETIC
+    df, DATA_STORE, _SYNTHETIC = frame, None, None
+    _CUBE_CACHE.clear()
+    try:
+        yield frame
+    finally:
+        df, DATA_STORE, _SYNTHETIC = saved
+        _CUBE_CACHE.clear()
+
+
+def create_slice_dashboards(slices=None, freq='M', by_group=True, out_dir='.', **dashboard_options):
+    """為每個切片在 out_dir/<label>/ 產生儀表板 (其餘參數同 create_dashboard)
+
+    slices 為 [{'label', 'start', 'end', 'group'}]，None 表示依 freq / by_group 自動切片 (見 period_slices)。
+    資料只載入與排序一次 (見 build_slice_index)，且只讀取所選圖表需要的欄位；
+    各切片以排序後資料的列範圍 (view) 建置圖表，沒有資料的切片略過。回傳 {label: 失敗圖表}。
+    """
+    by_department = by_group if slices is None else any(item.get('group') is not None for item in slices)
+    group_column = 'Department' if by_department else None
+    columns = dashboard_columns(dashboard_options.get('charts'))
+    if columns is not None:
+        columns = list(dict.fromkeys(columns + [TIME_COLUMN] + ([group_column] if group_column else [])))
+    with profile_stage('data prep'):
+        index = build_slice_index(load_columns(columns), group_column=group_column)
+    if slices is None:
+        slices = period_slices(index, freq=freq, by_group=by_group)
+    results = {}
+    for item in slices:
+        rows = slice_rows(index, item.get('start'), item.get('end'), item.get('group'))
+        if len(rows) == 0:
+            print(f"    [SKIP] {item['label']} (無資料)")
+            continue
+        print(f"切片 {item['label']}: {len(rows):,} 筆")
+        # 各圖表經由 load_columns / iter_data_chunks 讀取目前切片
+        with _using_frame(rows):
+            results[item['label']] = create_dashboard(out_dir=os.path.join(out_dir, item['label']),
+                                                      **dashboard_options)
+    return results
+
+# ============================================
+# 即時更新儀表板 (本機 asyncio 伺服器 + SSE 增量推送)
+# ============================================
+
+LIVE_HOST = '127.0.0.1'
+LIVE_DEFAULT_PORT = 8050
+LIVE_POINT_BUDGET = 20_000
+LIVE_POLL_SECONDS = 1.0
+# POST /append 內容上限 (超過回 413)
+LIVE_MAX_BODY_BYTES = 64 * 1024 * 1024
+LIVE_CHARTS = ['missing', 'animation', 'sunburst', '3d']
+LIVE_SCATTER_COLUMNS = ['Drug', 'Age', 'Dose', 'Level', 'Accept']
+# restyle 時由新圖表取出的 trace 屬性 (其餘屬性維持初次繪製的設定)
+LIVE_RESTYLE_KEYS = ('x', 'y', 'z', 'text', 'customdata', 'ids', 'labels', 'parents', 'values',
+                     'marker.color', 'marker.colors')
+
+LIVE_DASHBOARD_SCRIPT = """    <script>
+        // 伺服器以 SSE 推送增量：extendTraces 追加資料點，restyle / relayout 更新彙總值；
+        // 尚未繪製的圖表先暫存增量，繪製完成後依序套用
+        const readyCharts = {};
+        const pendingDeltas = {};
+        const deltaChains = {};
+
+        function applyDelta(delta) {
+            const plot = 'plot' + delta.chart;
+            if (delta.op === 'extend') {
+                return Plotly.extendTraces(plot, delta.update, delta.traces, delta.max_points);
+            }
+            if (delta.op === 'react') {
+                return Plotly.react(plot, delta.figure.data, delta.figure.layout);
+            }
+            return Plotly.restyle(plot, delta.update).then(function() {
+                return Plotly.relayout(plot, delta.relayout);
+            });
+        }
+
+        function queueDelta(delta) {
+            const chain = deltaChains[delta.chart] || Promise.resolve();
+            deltaChains[delta.chart] = chain.then(function() { return applyDelta(delta); })
+                .catch(function(err) { console.error(err); });
+        }
+
+        window.onChartRendered = function(index) {
+            readyCharts[index] = true;
+            (pendingDeltas[index] || []).forEach(queueDelta);
+            delete pendingDeltas[index];
+        };
+
+        new EventSource('/events').onmessage = function(event) {
+            JSON.parse(event.data).forEach(function(delta) {
+                if (readyCharts[delta.chart]) {
+                    queueDelta(delta);
+                } else {
+                    (pendingDeltas[delta.chart] = pendingDeltas[delta.chart] || []).push(delta);
+                }
+            });
+        };
+    </script>"""
+
+
+def _live_json(obj):
+    import plotly.utils
+    return json.dumps(obj, cls=plotly.utils.PlotlyJSONEncoder)
+
+
+def _plain_arrays(obj):
+    """將 numpy 陣列與 typed array spec 轉為 list，使瀏覽器端得到一般 Array (extendTraces 不接受 typed array)"""
+    if isinstance(obj, dict):
+        if set(obj) in ({'dtype', 'bdata'}, {'dtype', 'bdata', 'shape'}):
+            values = np.frombuffer(base64.b64decode(obj['bdata']), dtype=obj['dtype'])
+            if 'shape' in obj:
+                values = values.reshape([int(n) for n in str(obj['shape']).split(',')])
+            return values.tolist()
+        return {key: _plain_arrays(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_plain_arrays(value) for value in obj]
+    if isinstance(obj, np.ndarray):
+        return obj.tolist() if obj.dtype.kind in 'fiub' else [str(v) for v in obj]
+    return obj
+
+
+def _lookup(trace, key):
+    for part in key.split('.'):
+        if not isinstance(trace, dict) or part not in trace:
+            return None
+        trace = trace[part]
+    return trace
+
+
+def _figure_delta(index, old, new):
+    """比較同一圖表的前後版本 (to_dict 結果)，產生 restyle + relayout 增量；trace 結構改變時改送 react"""
+    if [t.get('type') for t in old['data']] != [t.get('type') for t in new['data']]:
+        return {'chart': index, 'op': 'react', 'figure': _plain_arrays(new)}
+    update = {}
+    for key in LIVE_RESTYLE_KEYS:
+        values = [_lookup(trace, key) for trace in new['data']]
+        if any(value is not None for value in values):
+            update[key] = _plain_arrays(values)
+    layout = new['layout']
+    relayout = {'title.text': _lookup(layout, 'title.text'),
+                'shapes': layout.get('shapes', []), 'annotations': layout.get('annotations', [])}
+    return {'chart': index, 'op': 'restyle', 'update': update, 'relayout': relayout}
+
+
+def _scatter_rows(batch):
+    """batch 中座標完整、可畫入 3D 散點圖的列，以及各列對應的 legendgroup"""
+    rows = complete_rows(batch[LIVE_SCATTER_COLUMNS], ['Age', 'Dose', 'Level'])
+    # 與 create_3d_scatter 相同：不在 DRUG_SHORT 中的藥物沿用原名；只對類別表查表
+    drug = rows['Drug'].astype('category')
+    names = np.array([DRUG_SHORT.get(name, name) for name in drug.cat.categories] + ['nan'], dtype=object)
+    short = names[drug.cat.codes.to_numpy()]
+    groups = 'group_' + short + '_' + rows['Accept'].astype(str).to_numpy(dtype=object)
+    return rows, groups
+
+
+def _sample_scatter_rows(state, batch, rate):
+    """累加各 legendgroup 的可畫列數，並以 rate 機率抽出 batch 中的點，回傳 (列, legendgroup)"""
+    rows, groups = _scatter_rows(batch)
+    counts = state['group_rows']
+    for group, count in zip(*np.unique(groups, return_counts=True)):
+        counts[group] = counts.get(group, 0) + int(count)
+    if rate >= 1:
+        return rows, groups
+    keep = state['rng'].random(len(rows)) < rate
+    return rows[keep], groups[keep]
+
+
+def _trace_point_caps(state):
+    """各 Scatter3d trace 最多保留的點數：point_budget 依各 legendgroup 的資料筆數比例分配 (總和約為 point_budget)"""
+    counts = {group: state['group_rows'].get(group, 0) for group in state['scatter_traces']}
+    total = max(sum(counts.values()), 1)
+    return {group: max(1, math.ceil(state['point_budget'] * count / total)) for group, count in counts.items()}
+
+
+def _scatter_trace_index(fig):
+    """3D 散點圖中各 (藥物縮寫, 接受狀態) legendgroup 對應的 Scatter3d trace 位置"""
+    return {trace.legendgroup: i for i, trace in enumerate(fig.data) if trace.type == 'scatter3d'}
+
+
+def create_live_state(point_budget=LIVE_POINT_BUDGET, seed=0):
+    """由目前資料來源建立即時儀表板的彙總狀態與初始圖表
+
+    只保留彙總量：缺失計數、階層 cube、完整率區間計數，以及最多約 point_budget 點的 3D 抽樣
+    (所有 trace 合計，見 _trace_point_caps)；之後的資料批次由 live_append 增量更新。
+    """
+    total = data_row_count()
+    times = load_columns([TIME_COLUMN])[TIME_COLUMN]
+    freq = _auto_bucket_freq(times.min(), times.max()) if times.notna().any() else '1D'
+    del times
+    state = {'missing': None, 'cube': None, 'completeness': None, 'point_budget': point_budget,
+             'rng': np.random.default_rng(seed), 'group_rows': {}}
+    samples = []
+    for chunk in iter_data_chunks():
+        _update_live_aggregates(state, chunk, freq)
+        samples.append(_sample_scatter_rows(state, chunk, point_budget / max(total, 1))[0])
+    if state['missing'] is None:
+        raise ValueError("資料為空，無法建立即時儀表板")
+    sample = pd.concat(samples) if samples else pd.DataFrame(columns=LIVE_SCATTER_COLUMNS)
+    with _using_frame(sample):
+        scatter = create_3d_scatter(single_trace=False)
+    state['scatter_traces'] = _scatter_trace_index(scatter)
+    # 3D 圖以一般 list 保存，伺服器端同步追加新點，之後開啟的頁面也能看到目前的抽樣
+    state['figures'] = {'missing': _missing_figure(state['missing']).to_dict(),
+                        'animation': _completeness_figure(state['completeness']).to_dict(),
+                        'sunburst': _sunburst_figure(state['cube']).to_dict(),
+                        '3d': _plain_arrays(scatter.to_dict())}
+    return state
+
+
+def _update_live_aggregates(state, batch, freq=None):
+    state['missing'] = update_missing_profile(state['missing'], batch)
+    state['cube'] = update_hierarchy_cube(state['cube'], batch, SUNBURST_LEVELS)
+    completeness = state['completeness']
+    state['completeness'] = update_completeness(completeness, batch.drop(columns=['Patient_ID'], errors='ignore'),
+                                                freq=freq if completeness is None else completeness['freq'])
+
+
+def live_append(state, batch):
+    """將新的資料批次併入彙總狀態，回傳要推送給瀏覽器的增量 (每個圖表一筆)"""
+    batch = coerce_tdm_schema(batch)
+    _update_live_aggregates(state, batch)
+    deltas = []
+    for name, figure in (('missing', _missing_figure(state['missing'])),
+                         ('animation', _completeness_figure(state['completeness'])),
+                         ('sunburst', _sunburst_figure(state['cube']))):
+        new = figure.to_dict()
+        deltas.append(_figure_delta(LIVE_CHARTS.index(name), state['figures'][name], new))
+        state['figures'][name] = new
+
+    # 3D 散點：依目前總筆數調整抽樣率，新抽到的點以 extendTraces 追加；
+    # 每個 trace 都送出 (可為空) 並附上各自的點數上限，使瀏覽器端所有 trace 合計維持在 point_budget 左右
+    rate = state['point_budget'] / max(state['missing']['rows'], 1)
+    sample, groups = _sample_scatter_rows(state, batch, rate)
+    caps = _trace_point_caps(state)
+    update, traces, max_points = {'x': [], 'y': [], 'z': []}, [], []
+    scatter = state['figures']['3d']['data']
+    for group, index in state['scatter_traces'].items():
+        rows = sample[groups == group]
+        traces.append(index)
+        max_points.append(caps[group])
+        for axis, col in zip('xyz', ('Age', 'Dose', 'Level')):
+            points = rows[col].to_numpy(dtype=np.float64).tolist()
+            update[axis].append(points)
+            scatter[index][axis] = (scatter[index][axis] + points)[-caps[group]:]
+    if traces:
+        deltas.append({'chart': LIVE_CHARTS.index('3d'), 'op': 'extend', 'update': update, 'traces': traces,
+                       'max_points': {axis: max_points for axis in update}})
+    return deltas
+
+
+def _read_batch_file(path):
+    if path.lower().endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def _parse_batch(body, content_type):
+    """POST /append 的內容：JSON 陣列 (每筆一個物件) 或 CSV"""
+    if 'json' in content_type:
+        return pd.DataFrame(json.loads(body.decode('utf-8')))
+    return pd.read_csv(io.BytesIO(body))
+
+
+def _http_response(status, body, content_type='text/plain; charset=utf-8'):
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    head = (f'HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n'
+            'Cache-Control: no-cache\r\nConnection: close\r\n\r\n')
+    return head.encode('latin-1') + body
+
+
+async def _read_http_request(reader, max_body=LIVE_MAX_BODY_BYTES):
+    """讀取一個 HTTP 請求，回傳 (method, path, headers, body)；連線已關閉時回傳 None
+
+    請求格式錯誤時拋出 ValueError，內容超過 max_body 位元組時拋出 OverflowError (皆不讀取內容)。
+    """
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    parts = request_line.decode('latin-1').split()
+    if len(parts) < 2:
+        raise ValueError("請求列格式錯誤")
+    method, target = parts[:2]
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = headers.get('content-length') or '0'
+    if not length.isdigit():
+        raise ValueError(f"Content-Length 格式錯誤: {length!r}")
+    if int(length) > max_body:
+        raise OverflowError(f"內容超過上限 {max_body:,} bytes")
+    body = await reader.readexactly(int(length))
+    return method, target.split('?', 1)[0], headers, body
+
+
+def _live_request_error(method, headers, port):
+    """檢查請求來源，拒絕時回傳 (狀態, 訊息)，否則回傳 None
+
+    Host 必須是本機位址 (防止 DNS rebinding 的網頁讀取儀表板)；
+    POST 若帶有 Origin 必須是儀表板本身 (防止任意網頁以跨站表單 / fetch 追加資料)，
+    未帶 Origin 的請求 (curl、腳本) 不受影響。
+    """
+    local = {f'127.0.0.1:{port}', f'localhost:{port}'}
+    if headers.get('host', '').lower() not in local:
+        return '403 Forbidden', 'host not allowed'
+    origin = headers.get('origin')
+    if method == 'POST' and origin is not None and origin.lower() not in {f'http://{host}' for host in local}:
+        return '403 Forbidden', 'cross-origin request not allowed'
+    return None
+
+
+def _live_page(state):
+    """目前彙總狀態的儀表板頁面 (Plotly 由 /plotly.min.js 載入)"""
+    charts = [dict(next(c for c in DASHBOARD_CHARTS if c['name'] == name), post_script=None)
+              for name in LIVE_CHARTS]
+    figures = [_live_json(state['figures'][name]) for name in LIVE_CHARTS]
+    return _single_page_html(figures, charts, '    <script src="/plotly.min.js"></script>',
+                             extra_scripts=[LIVE_DASHBOARD_SCRIPT])
+
+
+async def _serve_live(port, watch_dir, point_budget):
+    import asyncio
+    from plotly.offline import get_plotlyjs
+
+    loop = asyncio.get_running_loop()
+    print("建立即時儀表板彙總狀態...")
+    state = await loop.run_in_executor(None, create_live_state, point_budget)
+    clients = set()
+    lock = asyncio.Lock()
+
+    async def append(batch):
+        # 彙總更新在 executor 執行，不阻塞其他連線；批次依序套用
+        async with lock:
+            deltas = await loop.run_in_executor(None, live_append, state, batch)
+            message = _live_json(deltas)
+        for queue in list(clients):
+            queue.put_nowait(message)
+        print(f"    [OK] 追加 {len(batch):,} 筆 (共 {state['missing']['rows']:,} 筆，{len(clients)} 個瀏覽器)")
+
+    async def stream_events(writer):
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n'
+                     b'Cache-Control: no-cache\r\nConnection: keep-alive\r\n\r\n')
+        queue = asyncio.Queue()
+        clients.add(queue)
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=15)
+                    writer.write(f'data: {message}\n\n'.encode('utf-8'))
+                except asyncio.TimeoutError:
+                    writer.write(b': keepalive\n\n')
+                await writer.drain()
+        finally:
+            clients.discard(queue)
+
+    async def handle(reader, writer):
+        try:
+            try:
+                request = await _read_http_request(reader)
+            except OverflowError as exc:
+                writer.write(_http_response('413 Payload Too Large', str(exc)))
+                await writer.drain()
+                return
+            except ValueError as exc:
+                writer.write(_http_response('400 Bad Request', str(exc)))
+                await writer.drain()
+                return
+            if request is None:
+                return
+            method, path, headers, body = request
+            rejected = _live_request_error(method, headers, port)
+            if rejected is not None:
+                writer.write(_http_response(*rejected))
+            elif method == 'GET' and path == '/':
+                async with lock:
+                    page = _live_page(state)
+                writer.write(_http_response('200 OK', page, 'text/html; charset=utf-8'))
+            elif method == 'GET' and path == '/plotly.min.js':
+                writer.write(_http_response('200 OK', get_plotlyjs(), 'application/javascript; charset=utf-8'))
+            elif method == 'GET' and path == '/events':
+                await stream_events(writer)
+            elif method == 'POST' and path == '/append':
+                try:
+                    batch = _parse_batch(body, headers.get('content-type', ''))
+                    await append(batch)
+                except Exception as exc:
+                    writer.write(_http_response('400 Bad Request', f'{type(exc).__name__}: {exc}'))
+                else:
+                    writer.write(_http_response('200 OK', json.dumps({'rows': state['missing']['rows']}),
+                                                'application/json'))
+            else:
+                writer.write(_http_response('404 Not Found', 'not found'))
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def watch(directory):
+        done_dir = os.path.join(directory, 'processed')
+        os.makedirs(done_dir, exist_ok=True)
+        while True:
+            for name in sorted(os.listdir(directory)):
+                path = os.path.join(directory, name)
+                if not (os.path.isfile(path) and name.lower().endswith(('.csv', '.parquet'))):
+                    continue
+                try:
+                    batch = await loop.run_in_executor(None, _read_batch_file, path)
+                    await append(batch)
+                except Exception:
+                    print(f"    [FAIL] {name}")
+                    print(traceback.format_exc())
+                os.replace(path, os.path.join(done_dir, name))
+            await asyncio.sleep(LIVE_POLL_SECONDS)
+
+    server = await asyncio.start_server(handle, LIVE_HOST, port)
+    print(f"即時儀表板: http://{LIVE_HOST}:{port}/ (Ctrl+C 結束)")
+    print(f"追加資料: POST http://{LIVE_HOST}:{port}/append (CSV 或 JSON 陣列)")
+    tasks = []
+    if watch_dir is not None:
+        print(f"監看目錄: {watch_dir} (新的 .csv / .parquet 檔處理後移到 processed/)")
+        tasks.append(asyncio.ensure_future(watch(watch_dir)))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def serve_live_dashboard(port=LIVE_DEFAULT_PORT, watch_dir=None, point_budget=LIVE_POINT_BUDGET):
+    """啟動本機 (只接受 127.0.0.1) 即時儀表板伺服器
+
+    以目前資料來源建立彙總狀態後提供：
+    GET / 儀表板頁面、GET /events SSE 增量、POST /append 追加資料批次 (CSV 或 JSON 陣列)；
+    watch_dir 指定時，放入該目錄的 .csv / .parquet 檔 (請寫完後再移入) 也會被追加。
+    """
+    import asyncio
+    try:
+        asyncio.run(_serve_live(port, watch_dir, point_budget))
+    except KeyboardInterrupt:
+        print("即時儀表板已停止")
 
 # ============================================
 # 主程式
 # ============================================
 
+def main(argv=None):
+    """命令列進入點，回傳 exit code"""
+    import argparse
+
+    # 設定 UTF-8 輸出
+    if sys.platform == 'win32':
+        sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+
+    print("=" * 60)
+    print("TDM 互動式 EDA 生成程式 - 最終修正版 (V6 圖例 + 分頁修正)")
+    print("=" * 60)
+    print()
+
+    chart_names = [chart['name'] for chart in DASHBOARD_CHARTS]
+    parser = argparse.ArgumentParser(description="TDM 互動式 EDA 儀表板生成程式")
+    parser.add_argument('--charts', default=','.join(chart_names),
+                        help=f"要生成的圖表，以逗號分隔 (可用: {', '.join(chart_names)})")
+    parser.add_argument('--out-dir', default='.', help="輸出目錄 (預設為目前目錄)")
+    parser.add_argument('--rows', type=int, default=n_total, help=f"模擬資料筆數 (預設 {n_total})")
+    parser.add_argument('--seed', type=int, default=42, help="模擬資料亂數種子 (預設 42)")
+    parser.add_argument('--input', help="真實資料來源 (.csv / .parquet / .arrow)，指定時忽略 --rows/--seed")
+    parser.add_argument('--compact', action='store_true', help="共用 plotly.min.js 並以 base64 typed array 輸出")
+    parser.add_argument('--single-page', action='store_true', help="所有圖表放在單一頁面，第一次顯示時才繪製")
+    parser.add_argument('--jobs', type=int, default=1, help="平行建置圖表的 process 數 (預設 1)")
+    parser.add_argument('--reduce', choices=[mode for mode in REDUCE_MODES if mode],
+                        help="大量資料縮減：sample 分層抽樣 (3D 散點圖與平行座標圖)，voxel 3D 體素分箱 (平行座標圖改用抽樣)")
+    parser.add_argument('--point-budget', type=int, default=DEFAULT_POINT_BUDGET,
+                        help=f"與 --reduce 併用，抽樣時每個圖表最多輸出的資料點數 (預設 {DEFAULT_POINT_BUDGET})")
+    parser.add_argument('--cache-dir', help="增量建置快取目錄 (未指定則不使用快取)")
+    parser.add_argument('--cache-max-mb', type=float, help="快取大小上限 (MB)，超過時淘汰最久未使用的項目")
+    parser.add_argument('--slices', metavar='FREQ',
+                        help="依收集時間切片 (pandas period，如 M 每月、Q 每季)，每個切片輸出到 --out-dir 下的子目錄")
+    parser.add_argument('--by-department', action='store_true', help="與 --slices 併用，每個時間區間再依科別細分")
+    parser.add_argument('--serve', nargs='?', type=int, const=LIVE_DEFAULT_PORT, metavar='PORT',
+                        help=f"啟動本機即時儀表板伺服器 (預設埠 {LIVE_DEFAULT_PORT})，可持續追加資料")
+    parser.add_argument('--watch', metavar='DIR', help="與 --serve 併用，自動追加放入此目錄的 .csv / .parquet 檔")
+    parser.add_argument('--profile', action='store_true',
+                        help="列出各圖表 data load / data prep / figure build / serialize / write 的時間與峰值記憶體")
+    parser.add_argument('--metrics', metavar='PATH',
+                        help="將各圖表的階段時間、trace 數、點數與輸出位元組數寫入本機檔案")
+    parser.add_argument('--metrics-format', choices=METRIC_FORMATS, default='jsonl',
+                        help="--metrics 的格式：jsonl (附加，每列一筆) 或 prometheus (text exposition format)")
+    args = parser.parse_args(argv)
+
+    charts = [name.strip() for name in args.charts.split(',') if name.strip()]
+    unknown = sorted(set(charts) - set(chart_names))
+    if unknown:
+        parser.error(f"未知的圖表名稱: {', '.join(unknown)} (可用: {', '.join(chart_names)})")
+    if args.point_budget < 1:
+        parser.error("--point-budget 必須大於 0")
+
+    jobs = args.jobs
+    if args.metrics:
+        enable_metrics()
+    if args.profile:
+        enable_profiling()
+        if jobs > 1:
+            print("--profile 需在同一 process 量測記憶體，改以 --jobs 1 執行")
+            jobs = 1
+
+    if args.input:
+        with profile_stage('data load'):
+            use_data_source(args.input)
+    else:
+        set_synthetic_data(args.rows, args.seed)
+
+    if args.serve is not None:
+        serve_live_dashboard(args.serve, watch_dir=args.watch)
+        return 0
+
+    cache_max_bytes = None if args.cache_max_mb is None else int(args.cache_max_mb * 1e6)
+    options = dict(compact=args.compact, single_page=args.single_page, jobs=jobs, cache_dir=args.cache_dir,
+                   cache_max_bytes=cache_max_bytes, charts=charts, reduce=args.reduce,
+                   point_budget=args.point_budget)
+    if args.slices:
+        results = create_slice_dashboards(freq=args.slices, by_group=args.by_department, out_dir=args.out_dir,
+                                          **options)
+        failures = {f'{label}/{name}': error for label, errors in results.items() for name, error in errors.items()}
+    else:
+        failures = create_dashboard(out_dir=args.out_dir, **options)
+    if args.profile:
+        print(format_profile())
+    if args.metrics:
+        export_metrics(args.metrics, args.metrics_format)
+        print(f"指標已寫入 {args.metrics} ({args.metrics_format})")
+    return 1 if failures else 0
+
+
 if __name__ == "__main__":
-    create_dashboard()
\ No newline at end of file
+    sys.exit(main())